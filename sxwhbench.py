@@ -0,0 +1,356 @@
+import argparse
+import base64
+import http.client
+import itertools
+import json
+import os
+import random
+import re
+import ssl
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ACTIONS = ["connection-start", "connection-content", "connection-info", "connection-stop", "ping", "neighbor"]
+DEFAULT_MIX = "connection-start=2,connection-content=10,connection-info=4,connection-stop=2,ping=1,neighbor=1"
+
+
+class Sessions:
+    """
+    Connections "opened" by the benchmark, shared by all workers. Content, info and stop messages
+    are sent for open sessions only, ping carries all of them.
+    """
+
+    def __init__(self, limit: int):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.open = {}  # id -> label
+        self.ids = itertools.count(1)
+
+    @staticmethod
+    def label(n: int) -> str:
+        return f"tcp_10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}:{1024 + n % 60000}+192.0.2.{n % 250 + 1}:443"
+
+    def start(self):
+        sess_id = str(next(self.ids))
+        label = Sessions.label(int(sess_id))
+        with self.lock:
+            self.open[sess_id] = label
+        return sess_id, label
+
+    def pick(self):
+        with self.lock:
+            if self.open:
+                # dict keeps insertion order, recently opened sessions are at the end
+                sess_id = next(reversed(self.open))
+                return sess_id, self.open[sess_id]
+        return None
+
+    def stop(self):
+        with self.lock:
+            if len(self.open) == 0:
+                return None
+            # close the oldest one
+            sess_id = next(iter(self.open))
+            return sess_id, self.open.pop(sess_id)
+
+    def full(self):
+        with self.lock:
+            return len(self.open) >= self.limit
+
+    def all_ids(self):
+        with self.lock:
+            return list(self.open.keys())
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {action: [] for action in ACTIONS}
+        self.errors = {action: 0 for action in ACTIONS}
+        self.bytes_sent = 0
+
+    def add(self, action: str, latency: float, ok: bool, sent: int):
+        with self.lock:
+            if ok:
+                self.latency[action].append(latency)
+            else:
+                self.errors[action] += 1
+            self.bytes_sent += sent
+
+
+def percentile(values: list, q: float):
+    # values must be sorted
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Payloads:
+    def __init__(self, sessions: Sessions, content_size: int, neighbors: int):
+        self.sessions = sessions
+        self.content = base64.b64encode(os.urandom(content_size)).decode()
+        self.neighbors = [f"198.51.100.{i % 250 + 1}" for i in range(neighbors)]
+
+    def make(self, action: str):
+        # keep the session lifecycle consistent: no content/info/stop without start, no start over limit
+        sess = None
+        if action in ("connection-content", "connection-info"):
+            sess = self.sessions.pick()
+            if sess is None:
+                action = "connection-start"
+        elif action == "connection-start" and self.sessions.full():
+            action = "connection-stop"
+
+        if action == "connection-stop":
+            sess = self.sessions.stop()
+            if sess is None:
+                action = "connection-start"
+            else:
+                sess_id, label = sess
+                return action, {
+                    "action": action,
+                    "id": sess_id,
+                    "details": {"info": {"session": label}}
+                }
+
+        if action == "connection-start":
+            sess_id, label = self.sessions.start()
+            return action, {
+                "action": action,
+                "id": sess_id,
+                "details": {"info": {"session": label}}
+            }
+
+        if action == "connection-content":
+            sess_id, label = sess
+            return action, {
+                "action": action,
+                "id": sess_id,
+                "details": {"info": {"session": label, "side": random.choice("LR"), "content": self.content}}
+            }
+
+        if action == "connection-info":
+            sess_id, label = sess
+            return action, {
+                "action": action,
+                "id": sess_id,
+                "details": {"info": {"session": label,
+                                     "bytes_up": random.randint(0, 1 << 20),
+                                     "bytes_down": random.randint(0, 1 << 24)}}
+            }
+
+        if action == "ping":
+            return action, {"action": action, "proxies": self.sessions.all_ids()}
+
+        return action, {"action": "neighbor", "state": "update", "addresses": self.neighbors}
+
+
+class Worker(threading.Thread):
+    """
+    One keep-alive connection posting webhooks as fast as responses come back.
+    """
+
+    def __init__(self, target, path: str, mix: list, payloads: Payloads, stats: Stats, deadline: float):
+        super().__init__(daemon=True)
+        self.target = target
+        self.path = path
+        self.actions = [m[0] for m in mix]
+        self.weights = [m[1] for m in mix]
+        self.payloads = payloads
+        self.stats = stats
+        self.deadline = deadline
+        self.conn = None
+
+    def connect(self):
+        scheme, host, port = self.target
+        if scheme == "https":
+            self.conn = http.client.HTTPSConnection(host, port, timeout=30,
+                                                    context=ssl._create_unverified_context())
+        else:
+            self.conn = http.client.HTTPConnection(host, port, timeout=30)
+
+    def run(self):
+        self.connect()
+        while time.time() < self.deadline:
+            action, payload = self.payloads.make(random.choices(self.actions, self.weights)[0])
+            body = json.dumps(payload).encode()
+
+            ok = False
+            t1 = time.perf_counter()
+            try:
+                self.conn.request("POST", self.path, body=body, headers={"Content-Type": "application/json"})
+                resp = self.conn.getresponse()
+                resp.read()
+                ok = 200 <= resp.status < 300
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.connect()
+            t2 = time.perf_counter()
+
+            self.stats.add(action, t2 - t1, ok, len(body))
+
+        self.conn.close()
+
+
+def legacy_session_tuple(value: str):
+    # label parsing before memoization: pattern built and looked up on every call
+    pattern = r"(?:.*_)?([\d.:a-fA-F]+):(\d+)"
+    pattern = pattern + r"\+" + pattern
+    match = re.search(pattern, value)
+    return match.groups() if match else None
+
+
+def label_events(count: int, sessions: int, per_label: int) -> list:
+    # labels in the order webhooks bring them: 'per_label' messages (start, info, content, stop)
+    # of each session, interleaved among 'sessions' open at once
+    rnd = random.Random(1)
+    events = []
+    n = 0
+    while len(events) < count:
+        block = [Sessions.label(n + i) for i in range(sessions)] * per_label
+        rnd.shuffle(block)
+        events.extend(block)
+        n += sessions
+    return events[:count]
+
+
+def bench_labels(args) -> int:
+    from util.util import session_tuple
+
+    events = label_events(args.labels, args.sessions, args.label_repeat)
+    parsers = [
+        ("regex per call", legacy_session_tuple),
+        ("precompiled", session_tuple.__wrapped__),
+        ("memoized", session_tuple),
+    ]
+
+    print(f"label parsing: {len(events)} events, {args.label_repeat} per session, {args.sessions} sessions open")
+    results = {"events": len(events), "per_session": args.label_repeat, "sessions": args.sessions, "parsers": {}}
+    baseline = None
+    for name, func in parsers:
+        session_tuple.cache_clear()
+        started = time.perf_counter()
+        for label in events:
+            func(label)
+        per_event = (time.perf_counter() - started) / len(events) * 1e6
+        baseline = baseline or per_event
+
+        line = f"{name:<20}{per_event:>8.3f} us/event{baseline / per_event:>8.1f}x"
+        if func is session_tuple:
+            info = session_tuple.cache_info()
+            line += f"  (cache hits {info.hits / len(events) * 100:.1f}%)"
+        print(line)
+        results["parsers"][name] = {"us_per_event": per_event, "speedup": baseline / per_event}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def parse_mix(mix: str) -> list:
+    ret = []
+    for item in mix.split(","):
+        action, _, weight = item.partition("=")
+        action = action.strip()
+        if action not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action '{action}', use one of: {', '.join(ACTIONS)}")
+        ret.append((action, float(weight or 1)))
+    return ret
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Smithproxy Beholder - webhook load generator (fake Smithproxy)")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Beholder base URL (default: %(default)s)")
+    parser.add_argument("--key", help="API key")
+    parser.add_argument("--token", help="dynamic token")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="action weights, 'action=weight,...' (default: %(default)s)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="parallel connections (default: 8)")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="test duration in seconds (default: 10)")
+    parser.add_argument("--content-size", type=int, default=1400,
+                        help="connection-content payload size in bytes (default: 1400)")
+    parser.add_argument("--sessions", type=int, default=10000, help="maximum open sessions (default: 10000)")
+    parser.add_argument("--neighbors", type=int, default=16, help="addresses in neighbor update (default: 16)")
+    parser.add_argument("--json", help="write results also to this JSON file (to compare runs)")
+    parser.add_argument("--labels", type=int, metavar="N",
+                        help="instead of sending webhooks, measure session label parsing on N events (no server needed)")
+    parser.add_argument("--label-repeat", type=int, default=4,
+                        help="--labels: messages carrying the same label per session (default: %(default)s)")
+    args = parser.parse_args()
+
+    if not args.labels and not (args.key and args.token):
+        parser.error("--key and --token are required")
+    return args
+
+
+def report(stats: Stats, elapsed: float) -> dict:
+    results = {"elapsed": elapsed, "actions": {}}
+    total = 0
+    total_errors = 0
+
+    print(f"{'action':<20}{'count':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'p999 ms':>10}")
+    for action in ACTIONS:
+        lat = sorted(stats.latency[action])
+        errors = stats.errors[action]
+        if not lat and not errors:
+            continue
+
+        total += len(lat)
+        total_errors += errors
+        row = {
+            "count": len(lat),
+            "errors": errors,
+            "rps": len(lat) / elapsed,
+            "p50": percentile(lat, 0.50) * 1000,
+            "p99": percentile(lat, 0.99) * 1000,
+            "p999": percentile(lat, 0.999) * 1000,
+        }
+        results["actions"][action] = row
+        print(f"{action:<20}{row['count']:>9}{errors:>8}{row['rps']:>10.1f}"
+              f"{row['p50']:>10.2f}{row['p99']:>10.2f}{row['p999']:>10.2f}")
+
+    results["total"] = {"count": total, "errors": total_errors, "rps": total / elapsed}
+    print(f"{'total':<20}{total:>9}{total_errors:>8}{total / elapsed:>10.1f}")
+    print(f"sent {stats.bytes_sent / 1024 / 1024:.1f}MiB in {elapsed:.1f}s")
+    return results
+
+
+def main():
+    args = parse_args()
+    if args.labels:
+        return bench_labels(args)
+
+    url = urlsplit(args.url)
+    if url.scheme not in ("http", "https"):
+        print(f"unsupported URL scheme '{url.scheme}'")
+        return 1
+    target = (url.scheme, url.hostname, url.port or (443 if url.scheme == "https" else 80))
+    path = f"{url.path.rstrip('/')}/webhook/{args.key}/{args.token}"
+
+    stats = Stats()
+    payloads = Payloads(Sessions(args.sessions), args.content_size, args.neighbors)
+
+    print(f"{args.concurrency} connections to {args.url} for {args.duration}s, "
+          f"mix: {', '.join(f'{a}={w:g}' for a, w in args.mix)}")
+
+    start = time.time()
+    workers = [Worker(target, path, args.mix, payloads, stats, start + args.duration)
+               for _ in range(args.concurrency)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    results = report(stats, time.time() - start)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if results["total"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import argparse
+import logging
+import os
+import sys
+
+from ui.config import Config
+from ui.state import State
+from ws.script import script_runner
+from ws.webhook import Webhook
+
+log = logging.getLogger()
+
+
+def on_script_result(req, result):
+    if result.output:
+        log.debug(f"script output:\n{result.output}")
+
+
+def on_autorun_disabled(slot, reason):
+    # called directly by the script runner, there is no Qt event loop to deliver signals here
+    log.error(f"slot {slot} disabled ({reason}), all content passes unchanged")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Smithproxy Beholder - headless webhook processing, no GUI")
+    parser.add_argument("-c", "--config", help=f"config file (default: {Config.config_file})")
+    parser.add_argument("-p", "--project", help="project directory with slot_N.py scripts (default: from config)")
+    parser.add_argument("-s", "--slot", type=int, default=1, help="content script slot to run (default: 1)")
+    parser.add_argument("--address", help="listening address (default: from config)")
+    parser.add_argument("--port", type=int, help="listening port (default: from config)")
+    parser.add_argument("--engine", choices=["flask", "asyncio"], help="server engine (default: from config)")
+    parser.add_argument("--token", help="fixed dynamic token part of webhook URL (default: random)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.config:
+        Config.config_file = os.path.abspath(args.config)
+        Config.config_path = os.path.dirname(Config.config_file)
+    Config.load_config()
+
+    # command line overrides are not saved
+    with Config.lock:
+        if args.project:
+            Config.config['project_path'] = os.path.abspath(args.project)
+        if args.address:
+            Config.config['address'] = args.address
+        if args.port:
+            Config.config['port'] = args.port
+        if args.engine:
+            Config.config['server_engine'] = args.engine
+
+    script = Config.load_content_script(args.slot)
+    if not script:
+        log.fatal(f"no script in slot {args.slot}")
+        return 1
+
+    # content requests are processed by worker threads, not the webhook ones
+    script_runner.set_script(args.slot, script)
+    script_runner.on_result = on_script_result
+    script_runner.on_autorun_disabled = on_autorun_disabled
+    # nobody can re-enable the script here, content passes unchanged once it's disabled
+    script_runner.unattended = True
+
+    # content is always processed by the script
+    with State.ui.lock:
+        State.ui.skip_click = False
+        State.ui.content_tab.autorun = True
+        State.ui.content_tab.current_script_slot = args.slot
+
+    token = State.auth.register("headless", args.token)
+
+    log.info(f"webhook path: /webhook/<api_key>/{token}")
+
+    webhook = Webhook()
+    try:
+        Webhook.serve(webhook.make_engine())
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
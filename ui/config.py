@@ -17,7 +17,18 @@ class Config:
         'use_tls': False,
         'cert_path': os.path.join(os.path.expanduser('~'), _default_app_dir, 'cert.pem'),
         'key_path': os.path.join(os.path.expanduser('~'), _default_app_dir, 'key.pem'),
-        'ca_file': os.path.join(os.path.expanduser('~'), _default_app_dir, '')
+        'ca_file': os.path.join(os.path.expanduser('~'), _default_app_dir, ''),
+        'server_engine': 'flask',       # 'flask' or 'asyncio'
+        'server_workers': 32,           # asyncio: threads for actions waiting on content processing
+        'keepalive_timeout': 75,        # asyncio: idle keep-alive connection timeout (seconds)
+        'script_workers': 4,            # threads running auto-executed content scripts
+        'content_timeout': 0.5,         # auto-run script latency budget (seconds), then 'unchanged' is sent
+        'content_manual_timeout': 10,   # time to process content manually (seconds)
+        'script_overrun_limit': 3,      # disable auto-run after this many overruns in a row (0: never)
+        'connection_raw_json': False,   # keep (compressed) webhook JSON of connections for details pane
+        'connection_info_history': 32,  # connection-info changes kept per connection
+        'attic_memory_records': 1000,   # closed connections kept in memory, older are read from disk
+        'attic_max_mb': 256,            # attic file size limit, then it's rotated
     }
     config = {}
     config_path = os.path.join(os.path.expanduser('~'), '.smithproxy')
@@ -25,6 +36,9 @@ class Config:
 
     ssl_context = None
 
+    # API key published on config load/save, read without lock by webhook authentication
+    api_key = None
+
     @staticmethod
     def load_config():
         try:
@@ -40,6 +54,7 @@ class Config:
                     _def = copy.deepcopy(Config.default_config)
                     _def.update(json.load(f))
                     Config.config = _def
+                    Config.api_key = str(_def['api_key'])
 
                 keyfile = Config.config['key_path']
                 certfile = Config.config['cert_path']
@@ -53,9 +68,13 @@ class Config:
                         logging.error(f"error creating TLS context: {e}")
 
                 if Config.config['ca_file']:
-                    from ui.remotes import options
-                    options.ca_bundle = Config.config['ca_file']
-                    logging.info(f"remotes ca bundle set {options.ca_bundle}")
+                    try:
+                        from ui.remotes import options
+                        options.ca_bundle = Config.config['ca_file']
+                        logging.info(f"remotes ca bundle set {options.ca_bundle}")
+                    except ImportError:
+                        # headless mode without Qt - there are no remotes
+                        pass
 
         except FileNotFoundError as e:
             logging.fatal(f"Config.load_config: {e}")
@@ -69,6 +88,8 @@ class Config:
 
                 with open(Config.config_file, 'w') as f:
                     json.dump(Config.config, f, indent=4)
+
+                Config.api_key = str(Config.config['api_key'])
         except FileNotFoundError as e:
             logging.fatal(f"Config.load_config: {e}")
 
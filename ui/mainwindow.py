@@ -11,6 +11,7 @@ from ui.tab_remotes import RemoteTab
 from ui.tab_workbench import WorkbenchTab
 from ui.tab_connections import ConnectionTab
 from ui.tab_log import LogWidget
+from ui.tab_perf import PerfWidget
 from ui.settings_dialog import SettingsDialog
 
 logging.basicConfig(level=logging.DEBUG)
@@ -75,6 +76,10 @@ class MainWindow(QMainWindow):
         self.tab_widget.addTab(self.log_widget, 'Logs')
         self.widget_list.append(self.log_widget)
 
+        self.perf_widget = PerfWidget(self.remotes_widget.remote_widget.table)
+        self.tab_widget.addTab(self.perf_widget, 'Performance')
+        self.widget_list.append(self.perf_widget)
+
         self.setCentralWidget(self.tab_widget)
 
     def tab_changed(self, index):
@@ -18,6 +18,7 @@ import json
 from typing import Dict
 import functools
 
+from ws import metrics
 from ws.server import FlaskThread
 
 
@@ -56,6 +57,10 @@ class SmithproxyAPI:
 
         self.AUTHENTICATED = False
         self.access_table = {} # url: str -> timestamp (to track where we have been and when)
+
+        # registration health
+        self.registered_ts = None   # last successful registration
+        self.failed_registrations = 0   # failures in a row
         self.wh_dynamic_key = None
 
     def __del__(self):
@@ -326,8 +331,7 @@ class TableWidget(QTableWidget):
         self.connect_status[url] = False
         sx = SmithproxyAPI(url, verify)
         sx.set_secret(token)
-        with State.lock:
-            sx.set_dynamic_key(State.auth.register(url))
+        sx.set_dynamic_key(State.auth.register(url))
         self.sx_remotes[url] = sx
 
         self.on_item_changed_white_list.append((0,0))
@@ -376,7 +380,15 @@ class TableWidget(QTableWidget):
     def register(self, url):
         if url in self.sx_remotes.keys():
             sx = self.sx_remotes[url]
-            return sx.register_webhook_service(self.service, sx.verify)
+            ret = bool(sx.register_webhook_service(self.service, sx.verify))
+            if ret:
+                sx.registered_ts = time.time()
+                sx.failed_registrations = 0
+            else:
+                sx.failed_registrations += 1
+            # remote URLs are not exported: /metrics is served without credentials
+            metrics.remote_registrations.inc("ok" if ret else "failed")
+            return ret
         else:
             log.error(f"register: remote '{url}' not found")
 
@@ -426,8 +438,7 @@ class TableWidget(QTableWidget):
         else:
             new = True
             sx = SmithproxyAPI(url, verify)
-            with State.lock:
-                sx.set_dynamic_key(State.auth.register(url))
+            sx.set_dynamic_key(State.auth.register(url))
 
             self.sx_remotes[url] = sx
             log.debug(f"new smithproxy at '{url}'")
@@ -1,5 +1,5 @@
 from PyQt5.QtWidgets import QApplication, QMainWindow, QAction, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, \
-    QMessageBox, QCheckBox, QStyle, QHBoxLayout, QFileDialog
+    QMessageBox, QCheckBox, QStyle, QHBoxLayout, QFileDialog, QComboBox
 
 from ui.config import Config
 import logging
@@ -16,6 +16,8 @@ class SettingsDialog(QDialog):
         self.cert_field = QLineEdit()
         self.key_field = QLineEdit()
         self.ca_field = QLineEdit()
+        self.engine_field = QComboBox()
+        self.engine_field.addItems(["flask", "asyncio"])
 
         with Config.lock:
             self.address_field.setText(Config.config.get('address', ''))
@@ -25,6 +27,7 @@ class SettingsDialog(QDialog):
             self.cert_field.setText(Config.config.get('cert_path', ''))
             self.key_field.setText(Config.config.get('key_path', ''))
             self.ca_field.setText(Config.config.get('ca_file', ''))
+            self.engine_field.setCurrentText(Config.config.get('server_engine', 'flask'))
 
         save_button = QPushButton('Save and Close')
         save_button.clicked.connect(self.save_settings)
@@ -38,6 +41,8 @@ class SettingsDialog(QDialog):
         layout.addWidget(self.api_key_field)
         layout.addWidget(QLabel("TLS?"))
         layout.addWidget(self.tls_field)
+        layout.addWidget(QLabel("Server engine"))
+        layout.addWidget(self.engine_field)
 
         layout.addWidget(QLabel("Certificate Path (optional)"))
         certlayout = QHBoxLayout()
@@ -121,7 +126,8 @@ class SettingsDialog(QDialog):
             "use_tls":  self.tls_field.isChecked(),
             "cert_path": self.cert_field.text(),
             "key_path": self.key_field.text(),
-            "ca_file": self.ca_field.text()
+            "ca_file": self.ca_field.text(),
+            "server_engine": self.engine_field.currentText()
         }
 
         if self.ca_field.text():
@@ -2,9 +2,15 @@ import hashlib
 import ssl
 import threading
 
-from PyQt5 import QtCore
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal as Signal
+except ImportError:
+    # headless mode without Qt installed
+    from util.signal import QObject, Signal
 
 from util.bidict import BiDict
+from util.pending import PendingTable
+from util.tokenstore import TokenStore
 
 
 class Global:
@@ -14,55 +20,66 @@ class Global:
     samples_metadata = {1: {}, 2: {}, 3: {}}
 
 class State:
-    # Shared data structure for response
-    response_data = {"processed": False, "message": ""}
-    lock = threading.Lock()
-
+    """
+    Shared state split into independent parts, each with its own synchronization:
+    auth (token store snapshots), sessions registry, content pipeline (pending requests)
+    and UI flags/data.
+    """
 
     class auth:
-        dynamic_data = {}  # token -> identity string (for future use)
-        dynamic_token = []
         MAX_TOKENS = 200
-        @staticmethod
-        def register(identity) -> str:
-            rand = ssl.RAND_bytes(32)
-            hashed = hashlib.sha256(rand)
-            hashed = hashed.hexdigest()
-            State.auth.dynamic_data[hashed] = identity
-            State.auth.dynamic_token.append(hashed)
-
-            if len(State.auth.dynamic_token) > State.auth.MAX_TOKENS:
-                State.auth.dynamic_token.pop(0)
-                del State.auth.dynamic_data[hashed]
+        tokens = TokenStore(MAX_TOKENS)  # dynamic tokens -> identity string, usage counters
 
+        @staticmethod
+        def register(identity, token: str = None) -> str:
+            # token may be fixed (headless mode), random otherwise
+            if token:
+                hashed = token
+            else:
+                rand = ssl.RAND_bytes(32)
+                hashed = hashlib.sha256(rand)
+                hashed = hashed.hexdigest()
+
+            State.auth.tokens.add(hashed, identity)
             return hashed
 
         @staticmethod
         def validate_token(tok: str) -> bool:
-            return tok in State.auth.dynamic_token
+            return State.auth.tokens.validate(tok)
 
 
-    class StateEvents(QtCore.QObject):
-        # Shared event for button click signaling
-        content_processed = threading.Event()
-        received_session_start = QtCore.pyqtSignal(str, str, str)
-        received_session_stop = QtCore.pyqtSignal(str, str, str)
-        received_session_info = QtCore.pyqtSignal(str, str, str)
-        received_ping = QtCore.pyqtSignal()
-        click_1s = QtCore.pyqtSignal()
+    class StateEvents(QObject):
+        # session id, session label, parsed webhook payload
+        received_session_start = Signal(str, str, object)
+        received_session_stop = Signal(str, str, object)
+        received_session_info = Signal(str, str, object)
+        received_ping = Signal()
+        # sessions added {id: label} and removed [id] by ping reconciliation, one batch per ping
+        sessions_changed = Signal(object, object)
+        script_autorun_disabled = Signal(int, str)  # slot, reason
 
     events = StateEvents()
 
     class ui:
+        # guards everything in 'ui', including content_tab and workbench_tab
+        lock = threading.Lock()
+
+        # Shared data structure for response
+        response_data = {"processed": False, "message": ""}
+
         # should we just ignore everything and let webhooks flow with default answers
         skip_click: bool = True
         request_ping_plus = True
+        # log every N-th webhook payload (0: off)
+        payload_trace_every: int = 0
 
         class content_tab:
             autorun: bool = False
 
             session_id: str = None
             session_label: str = None
+            # key of the pending content request currently displayed
+            request_key: tuple = None
 
             # content bytes received
             content_data: bytes = None
@@ -80,4 +97,9 @@ class State:
             current_output = None
 
     class sessions:
+        lock = threading.Lock()
         sessions = BiDict()
+
+    class content:
+        # content requests waiting for script/user action
+        pending = PendingTable()
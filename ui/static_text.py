@@ -6,6 +6,7 @@ class S:
         "# Available variables:\n" \
         "# -- INPUT variables --\n" \
         "#  content_data - bytes of content data received from the proxy\n" \
+        "#  content_view - memoryview of content_data (slicing without copies)\n" \
         "#  content_side - 'L' or 'R', if from client('L'), or server respectively ('R')\n" \
         "#  session_id - unique proxy session identifier\n" \
         "#  session_label - string containing IPs and ports\n" \
@@ -1,16 +1,22 @@
-import copy
-import json
-import json
+import math
+import os
 import pprint
 import sys
 import time
+from collections import deque
 from pprint import pformat
 
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QTextOption, QColor
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractTableModel, QModelIndex, QTimer
+from PyQt5.QtGui import QTextOption, QColor, QFontMetrics
 from PyQt5.QtWidgets import QVBoxLayout, QWidget, QTextEdit, QSplitter, \
-    QHBoxLayout, QTableWidget, QTableWidgetItem, QTabWidget
-
+    QHBoxLayout, QTableView, QTabWidget, QHeaderView, QAbstractItemView, QLineEdit, QLabel, QApplication
+
+from util.attic import AtticStore
+from util.connindex import ConnectionIndex, ConnectionFilter
+from util.connrecord import ConnectionRecord
+from util.connstore import ConnectionStore
+from util.deadlines import DeadlineQueue
+from ws import metrics
 from util.fonts import load_font_prog
 from util.util import session_tuple
 
@@ -22,6 +28,7 @@ except ImportError:
     print("Ubuntu: apt-get install python3-pyqt5.qsci python3-pyperclip")
     sys.exit(1)
 
+from .config import Config
 from .state import State
 
 import logging
@@ -29,9 +36,98 @@ import logging
 log = logging.getLogger()
 
 
-class ConnectionsTableWidget(QTableWidget):
+class ColumnWidths:
+    """
+    Maximum text width of each column, maintained incrementally: widths of all rows are kept
+    as a multiset per column, so adding/removing/changing a row costs O(columns).
+    Text widths are cached, labels' addresses and ports repeat a lot.
+    """
+
+    MAX_CACHED = 8192
+
+    def __init__(self, font_metrics: QFontMetrics, columns: int):
+        self.font_metrics = font_metrics
+        self.counts = [{} for _ in range(columns)]  # width -> number of rows
+        self.max = [0] * columns
+        self.cache = {}  # text -> width
+
+    def text_width(self, text: str) -> int:
+        width = self.cache.get(text)
+        if width is None:
+            if len(self.cache) >= ColumnWidths.MAX_CACHED:
+                self.cache.clear()
+            width = self.font_metrics.horizontalAdvance(text)
+            self.cache[text] = width
+        return width
+
+    def add(self, col: int, text: str):
+        width = self.text_width(text)
+        counts = self.counts[col]
+        counts[width] = counts.get(width, 0) + 1
+        if width > self.max[col]:
+            self.max[col] = width
+
+    def remove(self, col: int, text: str):
+        width = self.text_width(text)
+        counts = self.counts[col]
+        left = counts.get(width, 0) - 1
+        if left > 0:
+            counts[width] = left
+            return
+
+        counts.pop(width, None)
+        if width == self.max[col]:
+            # distinct widths are few
+            self.max[col] = max(counts) if counts else 0
+
+    def clear(self):
+        for counts in self.counts:
+            counts.clear()
+        self.max = [0] * len(self.max)
+
+
+class ConnectionDetails:
+    """
+    Details pane of the selected connection. New connection-info of the shown connection is
+    appended as a history line, the pane is re-rendered only when the history rolled over.
+    """
+
+    def __init__(self, text_edit: QTextEdit):
+        self.text_edit = text_edit
+        self.record = None
+        self.appended = 0  # info lines appended since last full render
+
+    def show(self, record: ConnectionRecord):
+        self.record = record
+        self.appended = 0
+
+        text = pformat(record.details(), indent=2, sort_dicts=True, compact=True)
+        if record.info is not None:
+            text += "\n\ninfo history"
+            if record.info.dropped:
+                text += f" ({record.info.dropped} older changes dropped)"
+            text += ":\n" + "\n".join(record.info.lines())
+        self.text_edit.setText(text)
+
+    def info_added(self, record: ConnectionRecord):
+        if record is not self.record or record.info is None:
+            return
+
+        self.appended += 1
+        if self.appended > ConnectionRecord.info_limit or record.info_count == 1:
+            self.show(record)
+        else:
+            self.text_edit.append(record.info.lines(1)[0])
+
+
+class ConnectionsModel(QAbstractTableModel):
+    """
+    Table model over connection records indexed by session id. Only visible rows are
+    ever asked for their data, updates of a single connection are O(1).
+    Records are indexed by ConnectionIndex; with a filter set, rows are the matching
+    records only, kept up to date as connections are added, removed or change state.
+    """
 
-    removing_row = pyqtSignal(int)
     class cfg:
         conn_headers = ["Source", "Src Port", "Destination", "Dst Port", "State"]
         conn_headers_Source = 0
@@ -41,225 +137,450 @@ class ConnectionsTableWidget(QTableWidget):
         conn_headers_State = 4
 
         conn_headers_len = len(conn_headers)
-        TimeoutSec = 30
         color_expiring = "#f0f0f0"
 
-    def __init__(self, rows: int, parent=None):
-        super().__init__(rows, ConnectionsTableWidget.cfg.conn_headers_len, parent)
+        # removing more row ranges than this at once resets the model instead
+        max_remove_ranges = 16
+
+    def __init__(self, font, parent=None):
+        super().__init__(parent)
+        self.store = ConnectionStore()
+        self.conn_index = ConnectionIndex(keyed_by_id=True)
+        self.filter = None
+        self.shown = None  # ConnectionStore of records matching the filter
+        self.font = font
+        self.color_expiring = QColor(self.cfg.color_expiring)
+        self.widths = ColumnWidths(QFontMetrics(font), self.cfg.conn_headers_len)
+
+    def rows(self) -> ConnectionStore:
+        return self.store if self.filter is None else self.shown
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows().size()
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.cfg.conn_headers_len
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.cfg.conn_headers[section]
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        record = self.record_at(index.row())
+        col = index.column()
+
+        if role == Qt.DisplayRole:
+            return ConnectionsModel.column_text(record, col)
+        elif role == Qt.FontRole:
+            return self.font
+        elif role == Qt.BackgroundRole:
+            if col == self.cfg.conn_headers_State and record.expiring:
+                return self.color_expiring
+        elif role == Qt.UserRole:
+            return record
+
+        return None
+
+    @staticmethod
+    def column_text(record: ConnectionRecord, col: int) -> str:
+        if col == ConnectionsModel.cfg.conn_headers_State:
+            return record.state
+
+        tup = record.tuple
+        return tup[col] if col < len(tup) else ""
+
+    def record_at(self, row: int) -> ConnectionRecord:
+        return self.rows().record_at(row)
+
+    def get(self, id):
+        return self.store.get(id)
+
+    def records(self):
+        return self.store.values()
+
+    def total(self) -> int:
+        return self.store.size()
+
+    def add_record(self, record: ConnectionRecord):
+        self.add_records([record])
+
+    def add_records(self, records: list) -> list:
+        """
+        Records of the same id are replaced (also within the batch), returns the replaced ones.
+        """
+        latest = {r.id: r for r in records}
+        superseded = [r for r in records if latest[r.id] is not r]
+        records = list(latest.values())
+
+        replaced = [r.id for r in records if r.id in self.store]
+        superseded[:0] = self.remove_ids(replaced) if replaced else []
+
+        visible = records if self.filter is None else [r for r in records if self.filter.matches(r)]
+        if visible:
+            self.beginInsertRows(QModelIndex(), 0, len(visible) - 1)
+
+        for record in records:
+            self.store.add(record.id, record)
+            self.conn_index.add(record.id, record)
+            self.track_widths(record, self.widths.add)
+        if self.filter is not None:
+            for record in visible:
+                self.shown.add(record.id, record)
+
+        if visible:
+            self.endInsertRows()
+
+        return superseded
+
+    def track_widths(self, record: ConnectionRecord, func):
+        for col in range(self.cfg.conn_headers_len):
+            func(col, ConnectionsModel.column_text(record, col))
+
+    def set_state(self, id, state: str):
+        record = self.store.get(id)
+        if record is None or record.state == state:
+            return
+
+        col = self.cfg.conn_headers_State
+        self.widths.remove(col, record.state)
+        self.conn_index.set_state(id, record.state, state)
+        record.state = state
+        self.widths.add(col, state)
+
+        if self.filter is not None:
+            shown = id in self.shown
+            if self.filter.matches(record) != shown:
+                # record entering the filter is shown on top, as a new one
+                if shown:
+                    self.remove_rows(self.shown, [id])
+                else:
+                    self.beginInsertRows(QModelIndex(), 0, 0)
+                    self.shown.add(id, record)
+                    self.endInsertRows()
+                return
+
+        self.record_changed(id)
+
+    def record_changed(self, id):
+        row = self.rows().row_of(id)
+        if row >= 0:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.cfg.conn_headers_len - 1))
+
+    def remove_ids(self, ids) -> list:
+        if self.filter is None:
+            removed = self.remove_rows(self.store, ids)
+        else:
+            self.remove_rows(self.shown, ids)
+            removed = self.store.remove_many(ids)
+
+        for record in removed:
+            self.conn_index.remove(record.id, record)
+            self.track_widths(record, self.widths.remove)
+        return removed
+
+    def remove_rows(self, rows: ConnectionStore, ids) -> list:
+        # remove shown records, returns the removed ones
+        positions = sorted((r for r in (rows.row_of(id) for id in ids) if r >= 0), reverse=True)
+        if not positions:
+            return []
+
+        # contiguous row ranges, bottom first
+        ranges = []
+        for row in positions:
+            if ranges and ranges[-1][0] == row + 1:
+                ranges[-1][0] = row
+            else:
+                ranges.append([row, row])
+
+        if len(ranges) > self.cfg.max_remove_ranges:
+            self.beginResetModel()
+            removed = rows.remove_many(ids)
+            self.endResetModel()
+        else:
+            removed = []
+            for first, last in ranges:
+                self.beginRemoveRows(QModelIndex(), first, last)
+                removed.extend(rows.remove_many([rows.id_at(r) for r in range(first, last + 1)]))
+                self.endRemoveRows()
+
+        return removed
+
+    def set_filter(self, flt: ConnectionFilter):
+        self.beginResetModel()
+        if flt is None or flt.empty():
+            self.filter = None
+            self.shown = None
+        else:
+            self.filter = flt
+            self.shown = ConnectionStore()
+            position = self.store.position
+            ids = self.conn_index.query(flt)
+            if flt.closed_since is not None:
+                ids = [id for id in ids if flt.matches(self.store.get(id))]
+            for id in sorted(ids, key=position.__getitem__):
+                self.shown.add(id, self.store.get(id))
+        self.endResetModel()
+
+
+class AtticModel(ConnectionsModel):
+    """
+    Read-only model over closed connections archived in AtticStore. Rows are read from
+    the store as they are shown (recent ones from memory, older ones from disk by pages).
+    Filter narrows rows to records matched by the store's index.
+    """
+
+    def __init__(self, font, attic: AtticStore, parent=None):
+        super().__init__(font, parent)
+        self.attic = attic
+        self.matches = None  # record numbers matching the filter, newest first
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.matches) if self.matches is not None else self.attic.size()
+
+    def record_at(self, row: int) -> ConnectionRecord:
+        if self.matches is not None:
+            return self.attic.get(self.matches[row])
+        return self.attic.get(self.attic.size() - 1 - row)
+
+    def total(self) -> int:
+        return self.attic.size()
+
+    def add_records(self, records: list):
+        if not records:
+            return
+
+        if self.attic.full():
+            log.info(f"attic: {self.attic.path} is full, rotating")
+            self.beginResetModel()
+            self.attic.rotate()
+            if self.matches is not None:
+                self.matches = []
+            self.widths.clear()
+            self.endResetModel()
+
+        first = self.attic.size()
+        if self.matches is None:
+            self.beginInsertRows(QModelIndex(), 0, len(records) - 1)
+            self.attic.append_many(records)
+            self.endInsertRows()
+        else:
+            # archived just now
+            now = time.time()
+            visible = [first + i for i, r in enumerate(records) if self.filter.matches(r, now)]
+            if visible:
+                self.beginInsertRows(QModelIndex(), 0, len(visible) - 1)
+            self.attic.append_many(records)
+            if visible:
+                self.matches[:0] = visible[::-1]
+                self.endInsertRows()
+
+        # columns only grow in attic, widths of evicted records are not removed
+        for record in records:
+            self.track_widths(record, self.widths.add)
+
+    def set_filter(self, flt: ConnectionFilter):
+        self.beginResetModel()
+        if flt is None or flt.empty():
+            self.filter = None
+            self.matches = None
+        else:
+            self.filter = flt
+            self.matches = self.attic.query(flt)[::-1]
+        self.endResetModel()
+
+
+class ConnectionsTableView(QTableView):
+
+    removing_records = pyqtSignal(object)
+
+    class cfg(ConnectionsModel.cfg):
+        TimeoutSec = 30
+        # expiry deadlines are rounded up to this, expirations due together are applied at once
+        ExpiryResolutionSec = 0.1
+
+    def __init__(self, parent=None, attic: AtticStore = None):
+        super().__init__(parent)
+
+        self.table_font = load_font_prog()
+        self.table_font.setPointSize(self.table_font.pointSize() - 1)
+        self.font_metrics = QFontMetrics(self.table_font)
 
-        self.setHorizontalHeaderLabels(ConnectionsTableWidget.cfg.conn_headers)
+        if attic is not None:
+            self.conn_model = AtticModel(self.table_font, attic, self)
+        else:
+            self.conn_model = ConnectionsModel(self.table_font, self)
+        self.setModel(self.conn_model)
+
+        # fixed row height: no per-row measuring, view only lays out visible rows
         self.verticalHeader().setVisible(False)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.font_metrics.height() + 6)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
 
-        self.cellClicked.connect(self.on_cell_clicked)
-        self.cellActivated.connect(self.on_cell_clicked)
-        self.currentCellChanged.connect(self.on_cell_clicked)
-        State.events.click_1s.connect(self.rescan_connections)
+        self.clicked.connect(self.on_cell_clicked)
+        self.activated.connect(self.on_cell_clicked)
+        self.selectionModel().currentChanged.connect(self.on_cell_clicked)
 
         self.connection_details = None
         self.rescan = False
 
-        self.table_font = load_font_prog()
-        self.table_font.setPointSize(self.table_font.pointSize() - 1)
+        # expiry of closed connections: one timer armed for the earliest deadline
+        self.deadlines = DeadlineQueue()
+        self.expiry_timer = QTimer(self)
+        self.expiry_timer.setSingleShot(True)
+        self.expiry_timer.timeout.connect(self.on_expiry_timer)
 
-    def set_details_widget(self, connection_details: QTextEdit):
+    def set_details_widget(self, connection_details: ConnectionDetails):
         self.connection_details = connection_details
 
     def set_rescan(self, rescan: bool):
         self.rescan = rescan
 
-    def on_cell_clicked(self, row, col):
-        data_item = self.item(row, 0)
-        if data_item is not None:
-            metadata = data_item.data(Qt.UserRole)
-            if metadata is not None and self.connection_details:
-                self.connection_details.setText(pformat(metadata, indent=2, sort_dicts=True, compact=True))
+    def on_cell_clicked(self, index, *args):
+        if not index.isValid():
+            return
+
+        record = self.conn_model.data(index, Qt.UserRole)
+        if record is not None and self.connection_details:
+            self.connection_details.show(record)
 
-    def delete_rows(self, rows: [int]):
-        for i in sorted(rows, reverse=True):
-            self.removing_row.emit(i)
-            self.removeRow(i)
+    def delete_records(self, ids: list):
+        removed = self.conn_model.remove_ids(ids)
+        if removed:
+            self.removing_records.emit(removed)
 
     def custom_resize_columns(self):
-        for column in range(self.columnCount()):
-            width = self.columnWidth(column)
-            max_width = 0
-            for row in range(self.rowCount()):
-                item = self.item(row, column)
-                if item:
-                    new_width = self.fontMetrics().width(
-                        item.text()) + 20  # adding padding for visibility
-                    max_width = new_width if new_width > max_width else max_width
-            if max_width > width:
+        # widths are tracked by the model as rows change, columns only grow
+        for column in range(self.conn_model.columnCount()):
+            max_width = self.conn_model.widths.max[column] + 20  # adding padding for visibility
+            if max_width > self.columnWidth(column):
                 self.setColumnWidth(column, max_width)
 
-    def make_row_uneditable(self, row):
-        for col in range(ConnectionsTableWidget.cfg.conn_headers_len):
-            item = self.item(row, col)
-            if item is not None:
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-
-    def remove_stales(self):
+    def schedule_expiry(self, record: ConnectionRecord, now: float):
+        # closed connection is shown 'expiring' for the last third of its timeout, then removed
+        resolution = self.cfg.ExpiryResolutionSec
+        delete_ts = math.ceil((now + self.cfg.TimeoutSec) / resolution) * resolution
+        record.delete_ts = delete_ts
+
+        rearm = self.deadlines.push(delete_ts - self.cfg.TimeoutSec / 3, ("expiring", record))
+        rearm = self.deadlines.push(delete_ts, ("delete", record)) or rearm
+        if rearm or not self.expiry_timer.isActive():
+            self.arm_expiry_timer(now)
+
+    def arm_expiry_timer(self, now: float):
+        deadline = self.deadlines.next_deadline()
+        if deadline is None:
+            self.expiry_timer.stop()
+        else:
+            # never below resolution: no spinning on sub-millisecond gaps
+            delay = max(self.cfg.ExpiryResolutionSec, deadline - now)
+            self.expiry_timer.start(math.ceil(delay * 1000))
+
+    def on_expiry_timer(self):
+        now = time.time()
         to_rem = []
 
-        for i in range(0, self.rowCount()):
-            item = self.item(i, 0)
-            if item:
-                data_1 = item.data(Qt.UserRole + 1)
-                if data_1 is not None:
-                    if time.time() > data_1['delete_ts']:
-                        to_rem.append(i)
-                    elif data_1['delete_ts'] - time.time() < self.cfg.TimeoutSec / 3:
-                        status_item = self.item(i, self.cfg.conn_headers_State)
-                        if status_item:
-                            status_item.setBackground(QColor(self.cfg.color_expiring))
-                else:
-                    status_item = self.item(i, self.cfg.conn_headers_State)
-                    if status_item.text() in ["CLOSED", "WIPED"]:
-                        data_1 = {
-                            "delete_ts": time.time() + self.cfg.TimeoutSec
-                        }
-                        item.setData(Qt.UserRole + 1, data_1)
-                    else:
-                        # find session in session table
-                        data = item.data(Qt.UserRole)
-                        id = data.get("id", None)
-
-                        is_wiped = False
-                        with State.lock:
-                            if id and State.sessions.sessions.size() > 0 \
-                                    and State.sessions.sessions.forward.get(id) is None:
-                                    is_wiped = True
-
-                        if is_wiped:
-                            status_item.setText("WIPED")
-
-
-        if len(to_rem) > 0:
-            self.delete_rows(to_rem)
-
-    def add_already_existing(self):
-        session_ids = {}
-        with State.lock:
-            session_ids = copy.deepcopy(State.sessions.sessions.forward)
-
-        for i in range(self.rowCount()):
-            data = self.item(i, 0).data(Qt.UserRole)
-            sess_id = data.get("id")
-            if sess_id is not None:
-                if sess_id in session_ids.keys():
-                    del session_ids[sess_id]
-
-        for k in session_ids.keys():
-            log.debug(f'ConnectionsTabWidget.add_already_existing: should add {k}')
-            self.add_connection(k, session_ids[k], "{}")
-
-
-    def rescan_connections(self):
-        if self.rescan:
-            log.debug('ConnectionsTableWidget.rescan_connections')
-            self.remove_stales()
-            self.custom_resize_columns()
+        for kind, record in self.deadlines.pop_due(now):
+            # record may be gone already, or replaced by a new connection of the same id
+            if self.conn_model.get(record.id) is not record:
+                continue
 
-            try:
-                State.events.received_ping.disconnect(self.on_ping)
-            except TypeError:
-                pass
-            State.events.received_ping.connect(self.on_ping)
+            if kind == "delete":
+                to_rem.append(record.id)
+            elif not record.expiring:
+                record.expiring = True
+                self.conn_model.record_changed(record.id)
 
-    def on_ping(self):
-        if self.rescan:
-            log.debug('ConnectionsTableWidget.on_ping')
-            self.add_already_existing()
-
-    def add_connection(self, id: str, label: str, js: str):
-        rows = self.rowCount()
-        self.insertRow(0)
-
-        metadata = {
-            "id": id,
-            "label": label,
-            "start": {
-                "ts": time.time(),
-                "js": json.loads(js)
-            }
-        }
-
-        tup = session_tuple(label)
-        tup = tup if tup is not None else []
-
-        items = []
-        for i in range(ConnectionsTableWidget.cfg.conn_headers_len):
-            title = ""
-            if i < len(tup):
-                title = tup[i]
-
-            item = QTableWidgetItem(title)
-            item.setData(Qt.UserRole, metadata)
-            item.setFont(self.table_font)
-            items.append(item)
-
-        for i in range(len(items)):
-            self.setItem(0, i, items[i])
-
-        self.make_row_uneditable(0)
-        self.remove_stales()
-        self.custom_resize_columns()
-        self.resizeRowToContents(0)
+        if to_rem:
+            self.delete_records(to_rem)
 
-    def stop_connection(self, id: str, label: str, js: str):
-        log.info(f'session stop for {label}')
+        self.arm_expiry_timer(now)
 
-        for i in range(0, self.rowCount()):
-            item = self.item(i, 0)
-            if not item:
-                continue
+    def set_connection_state(self, id, state: str, now: float):
+        record = self.conn_model.get(id)
+        if record is None or record.state in ("CLOSED", "WIPED"):
+            return
+
+        self.conn_model.set_state(id, state)
+        if self.rescan:
+            self.schedule_expiry(record, now)
 
-            data = item.data(Qt.UserRole)
+    # Connection events are applied in batches by ConnectionTab, layout pass
+    # (column widths) is left to the caller, once per batch.
 
-            if data is not None and data['id'] == id:
-                stop = {
-                    "ts": time.time(),
-                    "js": json.loads(js)
-                }
+    def add_connections(self, connections: list):
+        # [(id, label, js, ts)]
+        records = []
+        for id, label, js, ts in connections:
+            tup = session_tuple(label)
+            records.append(ConnectionRecord(id, label, tup if tup is not None else (), ts, js))
 
-                state_item = self.item(i, ConnectionsTableWidget.cfg.conn_headers_State)
-                state_item.setText(f'CLOSED')
-                data['stop'] = stop
-                item.setData(Qt.UserRole, data)
+        # connection restarted under the same id: previous record goes away as if expired
+        replaced = self.conn_model.add_records(records)
+        if replaced:
+            self.removing_records.emit(replaced)
 
-        self.remove_stales()
+    def add_records(self, records: list):
+        self.conn_model.add_records(records)
         self.custom_resize_columns()
 
-    def add_connection_info(self, id: str, label: str, js: str):
-        for i in range(0, self.rowCount()):
-            item = self.item(i, 0)
-            data = item.data(Qt.UserRole)
+    def set_filter(self, flt: ConnectionFilter):
+        self.conn_model.set_filter(flt)
 
-            if data is not None and data['id'] == id:
-                info = {
-                    "ts": time.time(),
-                    "js": json.loads(js)
-                }
+    def stop_connection(self, id: str, label: str, js: dict, ts: float):
+        log.info(f'session stop for {label}')
 
-                if 'info' not in data.keys():
-                    data['info'] = []
-                data['info'].append(info)
+        record = self.conn_model.get(id)
+        if record is not None:
+            record.stop(ts, js)
+            self.set_connection_state(id, 'CLOSED', ts)
 
-                item.setData(Qt.UserRole, data)
+    def wipe_connection(self, id: str, ts: float):
+        # session removed from the registry by ping, without connection-stop
+        self.set_connection_state(id, 'WIPED', ts)
 
-        self.remove_stales()
-        self.custom_resize_columns()
+    def add_connection_info(self, id: str, label: str, js: dict, ts: float):
+        record = self.conn_model.get(id)
+        if record is not None:
+            record.add_info(ts, js)
+            if self.connection_details:
+                self.connection_details.info_added(record)
 
 
 class ConnectionTab(QWidget):
 
+    class cfg:
+        # connection events are applied at most this often
+        batch_interval_ms = 100
+
     def __init__(self):
         super().__init__()
 
+        with Config.lock:
+            ConnectionRecord.keep_raw = Config.config['connection_raw_json']
+            ConnectionRecord.info_limit = Config.config['connection_info_history']
+
+        # (kind, id, label, js, arrival ts), applied by apply_events()
+        self.events = deque()
+        self.batch_timer = QTimer(self)
+        self.batch_timer.setSingleShot(True)
+        self.batch_timer.timeout.connect(self.apply_events)
+
         self.initUI()
         State.events.received_session_start.connect(self.on_session_start)
         State.events.received_session_stop.connect(self.on_session_stop)
         State.events.received_session_info.connect(self.on_session_info)
+        State.events.sessions_changed.connect(self.on_sessions_changed)
 
     def initUI(self):
         mainLayout = QHBoxLayout()
@@ -278,16 +599,21 @@ class ConnectionTab(QWidget):
         splitter.addWidget(rightContainer)
         mainLayout.addWidget(splitter)
 
-        self.conn_live_table = ConnectionsTableWidget(0)
+        self.conn_live_table = ConnectionsTableView()
         self.conn_live_table.set_rescan(True)
-        self.conn_attic_table = ConnectionsTableWidget(0)
+        self.attic = AtticStore(os.path.join(Config.config_path, 'attic.jsonl'),
+                                memory_records=Config.config['attic_memory_records'],
+                                max_bytes=Config.config['attic_max_mb'] * 1024 * 1024)
+        QApplication.instance().aboutToQuit.connect(self.attic.close)
+        self.conn_attic_table = ConnectionsTableView(attic=self.attic)
         self.conn_attic_table.set_rescan(False)
 
         leftLayout.addWidget(self.conn_live_table)
 
         self.connection_details = QTextEdit()
-        self.conn_live_table.set_details_widget(self.connection_details)
-        self.conn_attic_table.set_details_widget(self.connection_details)
+        self.details = ConnectionDetails(self.connection_details)
+        self.conn_live_table.set_details_widget(self.details)
+        self.conn_attic_table.set_details_widget(self.details)
         self.connection_details.setReadOnly(True)
         self.connection_details.setWordWrapMode(QTextOption.NoWrap)
         self.connection_details.setFont(load_font_prog())
@@ -307,37 +633,117 @@ class ConnectionTab(QWidget):
         attic_layout.addWidget(self.conn_attic_table)
         self.tab_widget.addTab(attic_widget, "Attic")
 
+        filterLayout = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter: 10.0.0.0/8 port:443 port:1000-2000 state:closed id:<proxy id> "
+                                            "closed:15m label:<text> (Enter)")
+        self.filter_edit.setToolTip(ConnectionFilter.__doc__.strip())
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.returnPressed.connect(self.on_filter)
+        self.filter_edit.textChanged.connect(self.on_filter_changed)
+        self.filter_status = QLabel()
+        filterLayout.addWidget(self.filter_edit)
+        filterLayout.addWidget(self.filter_status)
+
+        leftLayout.addLayout(filterLayout)
         leftLayout.addWidget(self.tab_widget)
         rightLayout.addWidget(self.connection_details)
 
         self.setLayout(mainLayout)
 
-        self.conn_live_table.removing_row.connect(self.on_live_connection_delete)
-
-    def on_session_start(self, id: str, label: str, js: str):
-        self.conn_live_table.add_connection(id, label, js)
+        self.conn_live_table.removing_records.connect(self.on_live_connections_delete)
 
-    def on_session_stop(self, id: str, label: str, js: str):
-        self.conn_live_table.stop_connection(id, label, js)
+    def queue_event(self, kind: str, id: str, label: str, js: dict):
+        self.events.append((kind, id, label, js, time.time()))
+        # timer runs only while there is something to apply
+        if not self.batch_timer.isActive():
+            self.batch_timer.start(self.cfg.batch_interval_ms)
 
-    def on_session_info(self, id: str, label: str, js: str):
-        self.conn_live_table.add_connection_info(id, label, js)
+    def on_session_start(self, id: str, label: str, js: dict):
+        self.queue_event("start", id, label, js)
 
-    def on_live_connection_delete(self, row: int):
+    def on_session_stop(self, id: str, label: str, js: dict):
+        self.queue_event("stop", id, label, js)
 
-        self.conn_attic_table.insertRow(0)
+    def on_session_info(self, id: str, label: str, js: dict):
+        self.queue_event("info", id, label, js)
 
-        for col in range(self.conn_live_table.cfg.conn_headers_len):
-            item = self.conn_live_table.item(row, col)
+    def on_sessions_changed(self, added: dict, removed: list):
+        # sessions announced by ping-plus, and sessions proxy doesn't know anymore
+        for id, label in added.items():
+            self.queue_event("start", id, label, {})
+        for id in removed:
+            self.queue_event("wipe", id, None, None)
 
-            new_item = QTableWidgetItem(item.text())
-            new_item.setFont(self.conn_attic_table.table_font)
-            new_item.setData(Qt.UserRole, item.data(Qt.UserRole))
-            new_item.setData(Qt.UserRole + 1, item.data(Qt.UserRole))
+    def apply_events(self):
+        events = self.events
+        self.events = deque()
+        if not events:
+            return
 
-            self.conn_attic_table.setItem(0, col, new_item)
+        table = self.conn_live_table
+        lag = time.time() - events[0][4]
 
-        self.conn_attic_table.make_row_uneditable(0)
-        self.conn_attic_table.resizeRowToContents(0)
-        self.conn_attic_table.custom_resize_columns()
+        # runs of starts are inserted at once
+        starts = []
+        for kind, id, label, js, ts in events:
+            if kind == "start":
+                starts.append((id, label, js, ts))
+                continue
 
+            if starts:
+                table.add_connections(starts)
+                starts = []
+
+            if kind == "stop":
+                table.stop_connection(id, label, js, ts)
+            elif kind == "wipe":
+                table.wipe_connection(id, ts)
+            else:
+                table.add_connection_info(id, label, js, ts)
+
+        if starts:
+            table.add_connections(starts)
+
+        # single layout pass per batch
+        table.custom_resize_columns()
+        self.update_filter_status()
+
+        metrics.gui_batch_size.observe(len(events))
+        metrics.gui_batch_lag.observe(lag)
+        log.debug(f"connection events: batch of {len(events)} applied, lag {lag * 1000:.0f}ms")
+
+    def on_live_connections_delete(self, records: list):
+        for record in records:
+            record.expiring = False
+            record.delete_ts = None
+        self.conn_attic_table.add_records(records)
+        self.update_filter_status()
+
+    def on_filter(self):
+        try:
+            flt = ConnectionFilter.parse(self.filter_edit.text())
+        except ValueError as e:
+            self.filter_status.setText(str(e))
+            return
+
+        started = time.perf_counter()
+        self.conn_live_table.set_filter(flt)
+        self.conn_attic_table.set_filter(flt)
+        elapsed = time.perf_counter() - started
+
+        self.update_filter_status()
+        log.debug(f"connections filter '{self.filter_edit.text()}' applied in {elapsed * 1000:.1f}ms")
+
+    def update_filter_status(self):
+        live = self.conn_live_table.conn_model
+        attic = self.conn_attic_table.conn_model
+        if live.filter is None:
+            self.filter_status.setText("")
+        else:
+            self.filter_status.setText(f"live {live.rowCount()}/{live.total()}, "
+                                       f"attic {attic.rowCount()}/{attic.total()}")
+
+    def on_filter_changed(self, text: str):
+        if not text.strip():
+            self.on_filter()
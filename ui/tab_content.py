@@ -1,20 +1,16 @@
-import base64
-import copy
-import datetime
 import functools
-import json
 import sys
-import time
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QKeySequence, QTextCursor
 from PyQt5.QtWidgets import QPushButton, QVBoxLayout, QWidget, QTextEdit, QSplitter, \
-    QHBoxLayout, QCheckBox, QLabel, QShortcut
+    QHBoxLayout, QCheckBox, QLabel, QShortcut, QListWidget, QListWidgetItem
 
 import util.util
 from util.fonts import load_font_prog
 from util.err import error_pyperclip
-from util.util import capture_stdout_as_string, print_bytes, CharFilter
+from util.util import print_bytes
+from util.pending import PendingRequest
 from ui.static_text import S
 from .checkbutton import CheckButton
 from .common import create_python_editor
@@ -28,6 +24,7 @@ except ImportError:
     sys.exit(1)
 
 import ws.server
+from ws.script import script_variables, run_script, write_log_file, script_cache, script_runner, ScriptResult
 from .state import State, Global
 from .config import Config
 
@@ -39,9 +36,21 @@ class ContentWidget(QWidget):
     processButton: QPushButton | QPushButton
     DEFAULT_SCRIPT = S.py_default_script
 
+    script_finished = pyqtSignal(object, object)  # PendingRequest, ScriptResult from worker thread
+    content_done = pyqtSignal(object)  # PendingRequest answered or timed out, from any thread
+
     def __init__(self):
         super().__init__()
 
+        self.script_finished.connect(self.on_script_finished)
+        self.content_done.connect(self.on_content_done)
+
+        # content requests waiting for the user, in arrival order
+        self.pending_items = {}  # request key -> QListWidgetItem
+        self.current_request = None  # PendingRequest displayed
+        script_runner.on_result = self.script_finished.emit
+        script_runner.on_autorun_disabled = State.events.script_autorun_disabled.emit
+
         self.initUI()
 
         # Start the Flask thread
@@ -51,6 +60,7 @@ class ContentWidget(QWidget):
 
         State.events.received_session_start.connect(self.on_session_start)
         State.events.received_session_stop.connect(self.on_session_stop)
+        State.events.script_autorun_disabled.connect(self.on_autorun_disabled)
 
     def initUI(self):
         # Main layout and splitter
@@ -107,6 +117,14 @@ class ContentWidget(QWidget):
 
         leftLayout.addWidget(self.textEdit)
 
+        # requests held for manual processing, the displayed one is answered by 'Execute Script'
+        self.pendingList = QListWidget()
+        self.pendingList.setFont(font)
+        self.pendingList.setMaximumHeight(120)
+        self.pendingList.itemClicked.connect(self.on_pending_clicked)
+        leftLayout.addWidget(QLabel("Waiting requests:"))
+        leftLayout.addWidget(self.pendingList)
+
         leftButtons = QHBoxLayout()
         # leftButtons.addWidget(self.processButton)
         # sc_processButton = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_P), self)
@@ -203,14 +221,16 @@ class ContentWidget(QWidget):
     def on_content_processed(self):
         # Update shared data structure to be included in the Flask response
 
-        with State.lock:
-            State.response_data["processed"] = True
-            State.response_data["message"] = "Request has been processed successfully."
+        with State.ui.lock:
+            State.ui.response_data["processed"] = True
+            State.ui.response_data["message"] = "Request has been processed successfully."
+            key = State.ui.content_tab.request_key
 
-        State.events.content_processed.set()
+        # confirm displayed request unchanged
+        State.content.pending.resolve(key, None)
 
         self.textEdit.clear()
-        with State.lock:
+        with State.ui.lock:
             State.ui.content_data = None
 
         ContentWidget.set_label_bg_color(self.replacementLabel, "Gray")
@@ -218,39 +238,45 @@ class ContentWidget(QWidget):
 
     def on_skip_condition_toggled(self, state):
         if state == Qt.CheckState.Checked:
-            with State.lock:
+            with State.ui.lock:
                 State.ui.skip_click = True
             self.textEdit.setText(S.txt_skip_checked)
         else:
-            with State.lock:
+            with State.ui.lock:
                 State.ui.skip_click = False
             self.textEdit.setText(S.txt_skip_unchecked)
 
     def on_script_changed(self):
         self.autoRunCheckBox.setCheckState(Qt.Unchecked)
-        with State.lock:
+        with State.ui.lock:
             curslot = State.ui.content_tab.current_script_slot
 
+        script_cache.invalidate("content", curslot)
+        script_runner.set_script(curslot, self.scriptEdit.text())
         Config.save_content_script(curslot, self.scriptEdit.text())
 
     def on_autorun_toggled(self, state):
         if state == Qt.CheckState.Checked:
-            with State.lock:
+            with State.ui.lock:
                 State.ui.content_tab.autorun = True
         else:
-            with State.lock:
+            with State.ui.lock:
                 State.ui.content_tab.autorun = False
 
-    def on_session_start(self, id: str, label: str, js: str):
+    def on_autorun_disabled(self, slot: int, reason: str):
+        self.autoRunCheckBox.setCheckState(Qt.Unchecked)
+        self.outputEdit.setText(f">>> Auto-run was disabled: slot #{slot}: {reason}\n>>>\n")
+
+    def on_session_start(self, id: str, label: str, js: dict):
         log.debug(f"on_session_start: new session: {id}:{label}")
 
-    def on_session_stop(self, id: str, label: str, js: str):
+    def on_session_stop(self, id: str, label: str, js: dict):
         log.debug(f"on_session_stop: closed session: {id}:{label}")
-        with State.lock:
+        with State.ui.lock:
             died = State.ui.content_tab.session_id == id
         if died:
             self.conStateLabel.setText("ConState: CLOSED")
-            with State.lock:
+            with State.ui.lock:
                 label = State.ui.content_tab.session_label
             self.conLabel.setText(f"(closed) {label}")
             self.textEdit.setStyleSheet("QTextEdit { color: gray; }")
@@ -259,14 +285,6 @@ class ContentWidget(QWidget):
     def set_label_bg_color(label: QLabel, color_name: str):
         label.setStyleSheet(f'QLabel {{ background-color : {color_name}; }}')
 
-    def validate_results(self, exported_data: dict):
-        if exported_data['content_replacement']:
-            if isinstance(exported_data['content_replacement'], str) \
-                    or isinstance(exported_data['content_replacement'], bytes):
-                return
-
-            raise TypeError("content_replacement: must be 'bytes' or 'str'")
-
     def clear_storage(self):
         with Global.lock:
             Global.storage = {}
@@ -274,136 +292,133 @@ class ContentWidget(QWidget):
     def execute_script(self):
         # Get the script from scriptEdit
         script = self.scriptEdit.text()
-        output = ""
-
-        # Use the capture_stdout_as_string context manager to capture output
-        with capture_stdout_as_string() as captured_output:
-            try:
-                with State.lock:
-                    State.ui.content_tab.content_replacement = None
-                    exported_data = {
-                        "__name__": "__main__",
-                        'content_data': copy.copy(State.ui.content_tab.content_data),
-                        'content_side': State.ui.content_tab.content_side,
-                        'session_id': State.ui.content_tab.session_id,
-                        'session_label': State.ui.content_tab.session_label,
-                        'storage': Global.storage,
-                        'storage_lock': Global.lock,
-                        'samples': Global.samples,
-                        'samples_metadata': Global.samples_metadata,
-                        'content_replacement': None,
-                        'auto_process': False,
-                        # functions
-                        'print_bytes': print_bytes,
-                        'hex_print': print_bytes,
-                        'hexprint': print_bytes,
-                        # logging controls
-                        'do_log_file': False,
-                        'log_filename': None
-                    }
-                    exported_data['__appvars__'] = exported_data
-
-                with Config.lock:
-                    # add possibility to import directly from project path
-                    sys.path.append(Config.config['project_path'])
-
-                # Execute the script
-                exec(script, exported_data)
-                # After script execution, captured_output.getvalue() contains the output
-                output = captured_output.getvalue()
-                self.validate_results(exported_data)
-
-            except Exception as e:
-                was_checked = self.autoRunCheckBox.checkState() == Qt.Checked
-                self.autoRunCheckBox.setCheckState(Qt.Unchecked)
-                if was_checked:
-                    output += ">>> Auto-run was disabled\n"
-                output += f">>> Error executing script: {e}\n"
-                output += ">>>\n"
-                self.outputEdit.setText(output)
-                return
+
+        with State.ui.lock:
+            State.ui.content_tab.content_replacement = None
+            request_key = State.ui.content_tab.request_key
+            slot = State.ui.content_tab.current_script_slot
+            exported_data = script_variables(State.ui.content_tab.content_data,
+                                             State.ui.content_tab.content_side,
+                                             State.ui.content_tab.session_id,
+                                             State.ui.content_tab.session_label)
+
+        result = run_script(script, exported_data, slot, "content")
+        self.show_script_result(result)
+        if result.error:
+            return
+
+        if result.output and exported_data['do_log_file']:
+            write_log_file(exported_data, result.output)
+
+        # send result to the request it was computed for
+        if not State.content.pending.resolve(request_key, result.replacement):
+            log.debug(f"content request {request_key} not waiting anymore")
+
+    def on_script_finished(self, req: PendingRequest, result: ScriptResult):
+        # auto-executed script finished in a worker thread, just display it
+        self.show_script_result(result)
+
+    def show_script_result(self, result: ScriptResult):
+        if result.error:
+            output = ""
+            was_checked = self.autoRunCheckBox.checkState() == Qt.Checked
+            self.autoRunCheckBox.setCheckState(Qt.Unchecked)
+            if was_checked:
+                output += ">>> Auto-run was disabled\n"
+            output += f">>> Error executing script: {result.error}\n"
+            output += ">>>\n"
+            self.outputEdit.setText(output)
+            return
 
         # Display the output in the outputEdit text box
+        output = result.output
         if output is not None and output != "":
             self.outputEdit.setText(output)
             cursor = self.outputEdit.textCursor()
             cursor.movePosition(QTextCursor.End)
             self.outputEdit.setTextCursor(cursor)
 
-            if exported_data['do_log_file']:
-                log_filename = 'log.txt'
-                overridden_log_filename = str(exported_data['log_filename'])
-                if exported_data['log_filename'] is not None and overridden_log_filename != "":
-                    tmp = CharFilter.base_filename(overridden_log_filename, replacement='_')
-                    if tmp:
-                        log_filename = tmp
-
-                with open(f'{Config.config["project_path"]}/{log_filename}', 'a') as logfile:
-                    dt = datetime.datetime.now()
-                    logfile.write(f"{dt}:\n")
-                    logfile.write(output)
-                    logfile.write(f"-- \n")
-
         # collect results
-        if exported_data['content_replacement']:
-            with State.lock:
-                State.ui.content_tab.content_replacement = exported_data['content_replacement']
-                log.debug(f"Got replacement data: {len(State.ui.content_tab.content_replacement)}B")
-                self.replacementLabel.setText(f"replacement {len(exported_data['content_replacement'])}B")
-                ContentWidget.set_label_bg_color(self.replacementLabel, "LightCoral")
+        replacement = result.replacement
+        if replacement:
+            log.debug(f"Got replacement data: {len(replacement)}B")
+            self.replacementLabel.setText(f"replacement {len(replacement)}B")
+            ContentWidget.set_label_bg_color(self.replacementLabel, "LightCoral")
         else:
             log.debug("no replacements this time")
             self.replacementLabel.setText(f"No replacement")
             ContentWidget.set_label_bg_color(self.replacementLabel, "Gray")
 
-        State.events.content_processed.set()
-
-    def update_content(self, data):
+    def update_content(self, req: PendingRequest):
         log.debug("update_content_text")
-        with State.lock:
+        with State.ui.lock:
             should_update = not State.ui.skip_click
 
-        if should_update:
-            js = json.loads(data)
-            content = js['details']['info']['content']
-            content = base64.b64decode(content)
-            session_label = js['details']['info']['session']
-            session_side = js['details']['info']['side']
-            session_id = js['id']
-
-            with State.lock:
-                State.ui.content_tab.content_data = copy.copy(content)
-                State.ui.content_tab.content_data_last = copy.copy(content)
-                State.ui.content_tab.session_id = session_id
-                State.ui.content_tab.session_label = session_label
-                State.ui.content_tab.content_side = session_side
-
-            content = print_bytes(content)
-
-            self.textEdit.setText(f""
-                      f"Received data:\n\n{content}\n\n"
-                      f"1. You may run the script to modify content,\n"
-                      f"2. Click 'Process Request' to respond to confirm the payload.\n"
-                      f"3. Process can be automated:\n"
-                      f"      - 'Auto-Execute' check-box will run script on data arrival (1.)\n"
-                      f"      - setting 'auto_process' variable in the script (2.)")
-            self.conStateLabel.setText("ConState: LIVE")
-            self.conLabel.setText(f"{session_label}")
-
-            # run the script on data arrival
-            with State.lock:
-                should_execute = State.ui.content_tab.autorun
-            if should_execute:
-                d1 = time.time()
-                self.execute_script()
-                d2 = time.time()
-                log.info(f"::: content script execution took {(d2 - d1):.2f}s")
-
-            self.textEdit.setStyleSheet("")
+        if not should_update:
+            return
+
+        if not req.future.done():
+            # queued until answered, the callback may come from a webhook or worker thread
+            item = QListWidgetItem(f"{req.payload.session_label} [{req.payload.side}] {len(req.payload.data)}B")
+            item.setData(Qt.UserRole, req)
+            self.pending_items[req.key] = item
+            self.pendingList.addItem(item)
+            req.future.add_done_callback(lambda f, r=req: self.content_done.emit(r))
+
+        # request being processed by the user is not replaced by new ones
+        if self.current_request is None or self.current_request.future.done():
+            self.show_request(req)
+
+    def on_pending_clicked(self, item: QListWidgetItem):
+        self.show_request(item.data(Qt.UserRole))
+
+    def on_content_done(self, req: PendingRequest):
+        item = self.pending_items.pop(req.key, None)
+        if item is not None:
+            self.pendingList.takeItem(self.pendingList.row(item))
+
+        # display the oldest request still waiting
+        if req is self.current_request and self.pendingList.count():
+            self.show_request(self.pendingList.item(0).data(Qt.UserRole))
+
+    def show_request(self, req: PendingRequest):
+        self.current_request = req
+        item = self.pending_items.get(req.key)
+        if item is not None:
+            self.pendingList.setCurrentItem(item)
+
+        content = req.payload.data
+        session_label = req.payload.session_label
+        session_side = req.payload.side
+        session_id = req.payload.session_id
+
+        # bytes are immutable, no copies needed
+        with State.ui.lock:
+            State.ui.content_tab.content_data = content
+            State.ui.content_tab.content_data_last = content
+            State.ui.content_tab.session_id = session_id
+            State.ui.content_tab.session_label = session_label
+            State.ui.content_tab.content_side = session_side
+            State.ui.content_tab.request_key = req.key
+
+        content = print_bytes(content)
+
+        self.textEdit.setText(f""
+                  f"Received data:\n\n{content}\n\n"
+                  f"1. You may run the script to modify content,\n"
+                  f"2. Click 'Process Request' to respond to confirm the payload.\n"
+                  f"3. Process can be automated:\n"
+                  f"      - 'Auto-Execute' check-box will run script on data arrival (1.)\n"
+                  f"      - setting 'auto_process' variable in the script (2.)")
+        self.conStateLabel.setText("ConState: LIVE")
+        self.conLabel.setText(f"{session_label}")
+
+        # auto-executed script runs in a worker, result arrives to on_script_finished()
+        self.textEdit.setStyleSheet("")
 
     def on_script_slot_button(self, number):
         # number - it's not index, it starts with 1
-        with State.lock:
+        with State.ui.lock:
             # change buttons state only when clicking to non-active button
             if State.ui.content_tab.current_script_slot != number:
                 State.ui.content_tab.current_script_slot = number
@@ -424,7 +439,7 @@ class ContentWidget(QWidget):
 
     def on_copy_text(self):
         try:
-            with State.lock:
+            with State.ui.lock:
                 if State.ui.content_tab.content_data_last:
                     pyperclip.copy(print_bytes(State.ui.content_tab.content_data_last))
 
@@ -433,7 +448,7 @@ class ContentWidget(QWidget):
 
     def on_copy_pyby(self):
         try:
-            with State.lock:
+            with State.ui.lock:
                 if State.ui.content_tab.content_data_last:
                     pyperclip.copy(repr(State.ui.content_tab.content_data_last))
 
@@ -443,7 +458,7 @@ class ContentWidget(QWidget):
     def on_copy_sample(self, slot: int):
         with Global.lock:
             if State.ui.content_tab.content_data_last:
-                Global.samples[slot] = copy.copy(State.ui.content_tab.content_data_last)
+                Global.samples[slot] = State.ui.content_tab.content_data_last
                 Global.samples_metadata[slot] = {}
                 Global.samples_metadata[slot]["session_id"] = State.ui.content_tab.session_id
                 Global.samples_metadata[slot]["session_label"] = State.ui.content_tab.session_label
@@ -9,6 +9,7 @@ from util.fonts import load_font_prog, remove_ansi_color_codes
 
 from ui.checkbutton import CheckButton
 from ws.server import FlaskThread
+from ui.state import State
 
 log = logging.getLogger()
 
@@ -81,6 +82,19 @@ class LogWidget(QWidget):
         self.lineCount.addItems([f"{self.MAXLINES}", "500", "1000", "5000"])
         self.lineCount.currentTextChanged.connect(self.on_linecount_change)
         buttonBar.addWidget(self.lineCount)
+
+        # verbose payload trace (INFO level), sampling 1-in-N webhook payloads
+        self.traceButton = CheckButton("Trace payloads")
+        self.traceButton.setMaximumWidth(200)
+        self.traceButton.clicked.connect(self.on_trace_changed)
+        buttonBar.addWidget(self.traceButton)
+
+        self.traceSampling = QComboBox()
+        self.traceSampling.setMaximumWidth(200)
+        self.traceSampling.addItems(["1/1", "1/10", "1/100", "1/1000"])
+        self.traceSampling.setCurrentText("1/100")
+        self.traceSampling.currentTextChanged.connect(self.on_trace_changed)
+        buttonBar.addWidget(self.traceSampling)
         buttonBar.addStretch(4)
 
         self.editLinesLab = QLabel()
@@ -124,6 +138,14 @@ class LogWidget(QWidget):
             self.logEdit.appendPlainText(f"--- LogViewer Stop --- : {now}")
             self.widget_logger.enabled = False
 
+    def on_trace_changed(self):
+        every = 0
+        if self.traceButton.isChecked():
+            every = int(self.traceSampling.currentText().split("/")[1])
+
+        with State.ui.lock:
+            State.ui.payload_trace_every = every
+
     def on_log_level(self, text):
 
         rem = logging.getLogger('remotes')
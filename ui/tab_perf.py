@@ -0,0 +1,334 @@
+import time
+from collections import deque
+
+from PyQt5.QtCore import Qt, QTimer, QPointF
+from PyQt5.QtGui import QPainter, QColor, QPolygonF
+from PyQt5.QtWidgets import QVBoxLayout, QWidget, QTableWidget, QTableWidgetItem, QLabel, QHBoxLayout, QComboBox
+
+from ui.state import State
+from util.fonts import load_font_prog
+from ws import metrics
+
+
+class Sparkline(QWidget):
+    """
+    Line chart of the last values from a ring buffer, scaled to its maximum.
+    """
+
+    def __init__(self, values: deque, parent=None):
+        super().__init__(parent)
+        self.values = values
+        self.color = QColor("#3070b0")
+        self.setMinimumSize(60, 16)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#fafafa"))
+
+        if len(self.values) > 1:
+            peak = max(self.values) or 1
+            w = self.width() - 1
+            h = self.height() - 2
+            step = w / (self.values.maxlen - 1)
+            x0 = w - step * (len(self.values) - 1)
+
+            points = [QPointF(x0 + i * step, 1 + h - h * v / peak) for i, v in enumerate(self.values)]
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(self.color)
+            painter.drawPolyline(QPolygonF(points))
+
+        painter.end()
+
+
+class HistogramWindow:
+    """
+    Per-tick deltas of one histogram series kept in a ring buffer, percentiles are computed
+    over the whole window. Rates (per tick) are kept for the sparkline.
+    """
+
+    def __init__(self, size: int):
+        self.deltas = deque(maxlen=size)  # bucket count deltas
+        self.rates = deque(maxlen=size)  # observations/s
+        self.p99s = deque(maxlen=size)  # p99 of the tick, seconds
+        self.last_counts = None
+        self.period = 0.0
+
+    def update(self, buckets: tuple, counts: list, dt: float):
+        if self.last_counts is None:
+            delta = list(counts)
+        else:
+            delta = [c - p for c, p in zip(counts, self.last_counts)]
+        self.last_counts = counts
+
+        self.deltas.append(delta)
+        self.rates.append(sum(delta) / dt if dt > 0 else 0.0)
+        self.p99s.append(metrics.bucket_quantile(0.99, buckets, delta))
+        self.period = len(self.deltas) * dt
+
+    def idle(self, dt: float):
+        self.deltas.append([])
+        self.rates.append(0.0)
+        self.p99s.append(0.0)
+        self.period = len(self.deltas) * dt
+
+    def window(self) -> list:
+        total = None
+        for delta in self.deltas:
+            if not delta:
+                continue
+            total = list(delta) if total is None else [t + d for t, d in zip(total, delta)]
+        return total or []
+
+    def rate(self) -> float:
+        return self.rates[-1] if self.rates else 0.0
+
+
+class StatsTable(QTableWidget):
+    """
+    Rows are created once per series, then only their texts are updated.
+    """
+
+    def __init__(self, headers: list, chart_column: int, parent=None):
+        super().__init__(0, len(headers), parent)
+        self.setHorizontalHeaderLabels(headers)
+        self.verticalHeader().setVisible(False)
+        self.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.chart_column = chart_column
+        self.rows = {}  # key -> row
+        self.font = load_font_prog()
+
+        self.horizontalHeader().setStretchLastSection(True)
+        self.resizeColumnsToContents()
+        self.setColumnWidth(chart_column, 240)
+
+    def row_for(self, key, chart_values: deque) -> int:
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rowCount()
+            self.insertRow(row)
+            for col in range(self.columnCount()):
+                if col != self.chart_column:
+                    item = QTableWidgetItem("")
+                    item.setFont(self.font)
+                    self.setItem(row, col, item)
+            self.setCellWidget(row, self.chart_column, Sparkline(chart_values))
+            self.rows[key] = row
+            self.item(row, 0).setText(str(key))
+            self.resizeColumnToContents(0)
+        return row
+
+    def set_texts(self, row: int, texts: dict):
+        for col, text in texts.items():
+            self.item(row, col).setText(text)
+        chart = self.cellWidget(row, self.chart_column)
+        if chart:
+            chart.update()
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:.2f}"
+
+
+class PerfWidget(QWidget):
+    """
+    Live performance dashboard. Metrics are sampled into ring buffers at a fixed low rate,
+    rates and percentiles are computed from per-tick deltas of the metrics registry.
+    Sampling runs only while the tab is shown, deltas are rebased when it's shown again.
+    """
+
+    WINDOW = 120  # samples kept
+
+    def __init__(self, remotes_table=None):
+        super().__init__()
+        self.remotes_table = remotes_table
+        self.actions = {}  # action -> HistogramWindow
+        self.slots = {}  # slot -> HistogramWindow
+        self.queue_wait = HistogramWindow(PerfWidget.WINDOW)
+        self.pending = deque(maxlen=PerfWidget.WINDOW)
+        self.last_ts = None
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.on_tick)
+        self.initUI()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.rebase()
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
+    def initUI(self):
+        layout = QVBoxLayout()
+
+        buttonBar = QHBoxLayout()
+        buttonBar.setAlignment(Qt.AlignLeft)
+        buttonBar.addWidget(QLabel("Refresh:"))
+        self.refreshRate = QComboBox()
+        self.refreshRate.setMaximumWidth(200)
+        self.refreshRate.addItems(["1s", "2s", "5s"])
+        self.refreshRate.currentTextChanged.connect(self.on_refresh_rate)
+        buttonBar.addWidget(self.refreshRate)
+        buttonBar.addStretch(4)
+        self.windowLab = QLabel()
+        buttonBar.addWidget(self.windowLab)
+        layout.addLayout(buttonBar)
+
+        layout.addWidget(QLabel("Webhook actions"))
+        self.action_table = StatsTable(["Action", "Rate", "req/s", "p50 ms", "p99 ms", "p999 ms", "Errors"], 1)
+        layout.addWidget(self.action_table, 3)
+
+        layout.addWidget(QLabel("Content scripts"))
+        self.script_table = StatsTable(["Slot", "Runtime p99", "runs/s", "p50 ms", "p99 ms", "max ms",
+                                        "Errors", "Overruns"], 1)
+        layout.addWidget(self.script_table, 2)
+
+        layout.addWidget(QLabel("Content queue"))
+        self.queue_table = StatsTable(["Queue", "Depth", "Pending", "Wait p50 ms", "Wait p99 ms"], 1)
+        layout.addWidget(self.queue_table, 1)
+
+        layout.addWidget(QLabel("Remotes"))
+        self.remote_table = QTableWidget(0, 5)
+        self.remote_table.setHorizontalHeaderLabels(["Remote", "Status", "Last registration", "Failures in a row",
+                                                     "Webhooks received"])
+        self.remote_table.verticalHeader().setVisible(False)
+        self.remote_table.horizontalHeader().setStretchLastSection(True)
+        self.remote_table.resizeColumnsToContents()
+        self.remote_table.setColumnWidth(0, 400)
+        self.remote_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.remote_table, 1)
+
+        self.setLayout(layout)
+
+    def on_refresh_rate(self, text):
+        self.timer.setInterval(int(text[:-1]) * 1000)
+
+    def on_tick(self):
+        now = time.time()
+        dt = now - self.last_ts if self.last_ts else self.timer.interval() / 1000
+        self.last_ts = now
+
+        self.sample(dt)
+        self.refresh()
+
+    @staticmethod
+    def sample_histogram(series: dict, histogram: metrics.Histogram, dt: float):
+        snapshot = histogram.snapshot()
+        for labels, (counts, _, _) in snapshot.items():
+            window = series.get(labels)
+            if window is None:
+                window = HistogramWindow(PerfWidget.WINDOW)
+                series[labels] = window
+            window.update(histogram.buckets, counts, dt)
+
+        for labels, window in series.items():
+            if labels not in snapshot:
+                window.idle(dt)
+
+    @staticmethod
+    def rebase_histogram(series: dict, histogram: metrics.Histogram):
+        # next tick's delta starts from current counts, not from the last sample before hiding
+        for labels, (counts, _, _) in histogram.snapshot().items():
+            window = series.get(labels)
+            if window is None:
+                window = HistogramWindow(PerfWidget.WINDOW)
+                series[labels] = window
+            window.last_counts = counts
+
+    def rebase(self):
+        PerfWidget.rebase_histogram(self.actions, metrics.webhook_latency)
+        PerfWidget.rebase_histogram(self.slots, metrics.script_run)
+
+        counts, _, _ = metrics.content_queue_wait.snapshot().get((), (None, 0, 0))
+        if counts is not None:
+            self.queue_wait.last_counts = counts
+        self.last_ts = time.time()
+
+    def sample(self, dt: float):
+        PerfWidget.sample_histogram(self.actions, metrics.webhook_latency, dt)
+        PerfWidget.sample_histogram(self.slots, metrics.script_run, dt)
+
+        counts, _, _ = metrics.content_queue_wait.snapshot().get((), (None, 0, 0))
+        if counts is None:
+            self.queue_wait.idle(dt)
+        else:
+            self.queue_wait.update(metrics.content_queue_wait.buckets, counts, dt)
+        self.pending.append(metrics.content_pending.value())
+
+        self.windowLab.setText(f"Window: {self.queue_wait.period:.0f}s")
+
+    def refresh(self):
+        buckets = metrics.webhook_latency.buckets
+
+        errors = {}
+        for (action, code), count in metrics.webhook_requests.snapshot().items():
+            if not code.startswith("2"):
+                errors[action] = errors.get(action, 0) + count
+
+        for (action,), window in sorted(self.actions.items()):
+            counts = window.window()
+            row = self.action_table.row_for(action, window.rates)
+            self.action_table.set_texts(row, {
+                2: f"{window.rate():.1f}",
+                3: ms(metrics.bucket_quantile(0.5, buckets, counts)),
+                4: ms(metrics.bucket_quantile(0.99, buckets, counts)),
+                5: ms(metrics.bucket_quantile(0.999, buckets, counts)),
+                6: str(errors.get(action, 0)),
+            })
+
+        buckets = metrics.script_run.buckets
+        for (slot,), window in sorted(self.slots.items()):
+            counts = window.window()
+            row = self.script_table.row_for(slot, window.p99s)
+            self.script_table.set_texts(row, {
+                2: f"{window.rate():.1f}",
+                3: ms(metrics.bucket_quantile(0.5, buckets, counts)),
+                4: ms(metrics.bucket_quantile(0.99, buckets, counts)),
+                5: ms(metrics.bucket_quantile(1.0, buckets, counts)),
+                6: str(metrics.script_errors.value(slot)),
+                7: str(metrics.script_overruns.value(slot)),
+            })
+
+        buckets = metrics.content_queue_wait.buckets
+        counts = self.queue_wait.window()
+        row = self.queue_table.row_for("content", self.pending)
+        self.queue_table.set_texts(row, {
+            2: str(self.pending[-1] if self.pending else 0),
+            3: ms(metrics.bucket_quantile(0.5, buckets, counts)),
+            4: ms(metrics.bucket_quantile(0.99, buckets, counts)),
+        })
+
+        self.refresh_remotes()
+
+    def refresh_remotes(self):
+        if self.remotes_table is None:
+            return
+
+        # webhooks received with tokens registered by each remote
+        received = {}
+        for identity, uses, _ in State.auth.tokens.usage():
+            received[identity] = received.get(identity, 0) + uses
+
+        now = time.time()
+        remotes = self.remotes_table.sx_remotes
+        self.remote_table.setRowCount(len(remotes))
+
+        for row, (url, sx) in enumerate(sorted(remotes.items())):
+            if not self.remotes_table.connect_status.get(url):
+                status = "failing" if sx.failed_registrations else "inactive"
+            else:
+                status = "registered"
+
+            last = f"{now - sx.registered_ts:.0f}s ago" if sx.registered_ts else "never"
+            texts = [url, status, last, str(sx.failed_registrations), str(received.get(url, 0))]
+
+            for col, text in enumerate(texts):
+                item = self.remote_table.item(row, col)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.remote_table.setItem(row, col, item)
+                item.setText(text)
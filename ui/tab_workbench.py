@@ -24,11 +24,12 @@ except ImportError:
     print("Ubuntu: apt-get install python3-pyqt5.qsci python3-pyperclip")
     sys.exit(1)
 
-from util.util import capture_stdout_as_string, print_bytes
+from util.util import print_bytes
 from util.err import error_pyperclip
 
 from .state import State, Global
 from .config import Config
+from ws.script import script_variables, run_script, script_cache
 
 import logging
 
@@ -168,101 +169,70 @@ class WorkbenchTab(QWidget):
 
     def on_script_changed(self):
         self.autoRunCheckBox.setCheckState(Qt.Unchecked)
-        with State.lock:
+        with State.ui.lock:
             curslot = State.ui.workbench_tab.current_script_slot
 
+        script_cache.invalidate("workbench", curslot)
         Config.save_content_script(curslot, self.scriptEdit.text())
 
     def on_autorun_toggled(self, state):
         if state == Qt.CheckState.Checked:
-            with State.lock:
+            with State.ui.lock:
                 State.ui.workbench_tab.autorun = True
         else:
-            with State.lock:
+            with State.ui.lock:
                 State.ui.workbench_tab.autorun = False
 
-    def validate_results(self, exported_data: dict):
-        if exported_data['content_replacement']:
-            if isinstance(exported_data['content_replacement'], str) \
-                    or isinstance(exported_data['content_replacement'], bytes):
-                return
-
-            raise TypeError("content_replacement: must be 'bytes' or 'str'")
-
     def execute_script(self):
         # Get the script from scriptEdit
         script = self.scriptEdit.text()
-        output = ""
-
-        # Use the capture_stdout_as_string context manager to capture output
-        with capture_stdout_as_string() as captured_output:
-            try:
-                with State.lock:
-                    sample_key = State.ui.workbench_tab.current_sample_key
-
-                with Global.lock:
-                    sample_meta = {}
-                    if sample_key in Global.samples_metadata.keys():
-                        hot_data = Global.samples_metadata[sample_key]
-                        if hot_data:
-                            sample_meta = copy.deepcopy(hot_data)
-
-                with State.lock:
-
-                    # reset results
-                    State.ui.content_tab.content_replacement = None
-                    State.ui.workbench_tab.current_output = None
-
-                    # prepare shared data (fake live variables, default to None)
-                    exported_data = {
-                        "__name__": "__main__",
-                        'content_data': copy.copy(State.ui.workbench_tab.current_sample),
-                        'content_side': sample_meta.get('content_side', None),
-                        'session_id': sample_meta.get('session_id', None),
-                        'session_label': sample_meta.get('session_label', None),
-                        'storage': Global.storage,
-                        'storage_lock': Global.lock,
-                        'samples': Global.samples,
-                        'samples_metadata': Global.samples_metadata,
-                        'content_replacement': None,
-                        'auto_process': False,
-                        # functions
-                        'print_bytes': print_bytes,
-                        'hex_print': print_bytes,
-                        'hexprint': print_bytes,
-                    }
-                    exported_data['__appvars__'] = exported_data
-
-                with Config.lock:
-                    # add possibility to import directly from project path
-                    sys.path.append(Config.config['project_path'])
-
-                # Execute the script
-                exec(script, exported_data)
-                # After script execution, captured_output.getvalue() contains the output
-                output = captured_output.getvalue()
-                self.validate_results(exported_data)
-
-            except Exception as e:
-                was_checked = self.autoRunCheckBox.checkState() == Qt.Checked
-                self.autoRunCheckBox.setCheckState(Qt.Unchecked)
-                if was_checked:
-                    output += ">>> Auto-run was disabled\n"
-                output += f">>> Error executing script: {e}\n"
-                output += ">>>\n"
-                self.outputEdit.setText(output)
-                return
+
+        with State.ui.lock:
+            sample_key = State.ui.workbench_tab.current_sample_key
+            slot = State.ui.workbench_tab.current_script_slot
+
+        with Global.lock:
+            sample_meta = {}
+            if sample_key in Global.samples_metadata.keys():
+                hot_data = Global.samples_metadata[sample_key]
+                if hot_data:
+                    sample_meta = copy.deepcopy(hot_data)
+
+        with State.ui.lock:
+
+            # reset results
+            State.ui.content_tab.content_replacement = None
+            State.ui.workbench_tab.current_output = None
+
+            # prepare shared data (fake live variables, default to None)
+            exported_data = script_variables(State.ui.workbench_tab.current_sample,
+                                             sample_meta.get('content_side', None),
+                                             sample_meta.get('session_id', None),
+                                             sample_meta.get('session_label', None))
+
+        result = run_script(script, exported_data, slot, "workbench")
+
+        if result.error:
+            output = ""
+            was_checked = self.autoRunCheckBox.checkState() == Qt.Checked
+            self.autoRunCheckBox.setCheckState(Qt.Unchecked)
+            if was_checked:
+                output += ">>> Auto-run was disabled\n"
+            output += f">>> Error executing script: {result.error}\n"
+            output += ">>>\n"
+            self.outputEdit.setText(output)
+            return
 
         # Display the output in the outputEdit text box
-        self.outputEdit.setText(output)
-        if exported_data['content_replacement']:
-            data = exported_data['content_replacement']
+        self.outputEdit.setText(result.output)
+        if result.replacement:
+            data = result.replacement
             if isinstance(data, str):
                 data = data.encode()
 
             self.textEdit.setText(print_bytes(data))
 
-            with State.lock:
+            with State.ui.lock:
                 State.ui.workbench_tab.current_output = data
                 self.textEdit.setText(print_bytes(data))
         else:
@@ -271,7 +241,7 @@ class WorkbenchTab(QWidget):
 
     def on_script_slot_button(self, number):
         # number - it's not index, it starts with 1
-        with State.lock:
+        with State.ui.lock:
             # change buttons state only when clicking to non-active button
             if State.ui.workbench_tab.current_script_slot != number:
                 State.ui.workbench_tab.current_script_slot = number
@@ -293,7 +263,7 @@ class WorkbenchTab(QWidget):
 
     def on_copy_text(self):
         try:
-            with State.lock:
+            with State.ui.lock:
                 if State.ui.workbench_tab.current_output:
                     pyperclip.copy(print_bytes(State.ui.workbench_tab.current_output))
                 elif State.ui.workbench_tab.current_sample:
@@ -304,7 +274,7 @@ class WorkbenchTab(QWidget):
 
     def on_copy_pyby(self):
         try:
-            with State.lock:
+            with State.ui.lock:
                 if State.ui.workbench_tab.current_output:
                     pyperclip.copy(repr(State.ui.workbench_tab.current_output))
                 elif State.ui.workbench_tab.current_sample:
@@ -324,7 +294,7 @@ class WorkbenchTab(QWidget):
             else:
                 self.textEdit.setText(f"# slot {slot} empty")
 
-        with State.lock:
+        with State.ui.lock:
             State.ui.workbench_tab.current_sample = data
             State.ui.workbench_tab.current_sample_key = slot
             State.ui.workbench_tab.current_output = None
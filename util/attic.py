@@ -0,0 +1,143 @@
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from util import jsoncodec
+from util.connindex import ConnectionIndex, ConnectionFilter
+from util.connrecord import ConnectionRecord
+
+log = logging.getLogger()
+
+
+class AtticStore:
+    """
+    Closed connections archive: append-only JSON lines file with in-memory index
+    (file offset and archive time of each record, ConnectionIndex by record number).
+    Only the most recent records are kept in memory, older ones are read back from disk
+    in pages when they are displayed. Not thread-safe, it's owned by the GUI thread.
+
+    Each run starts a new file, previous one is kept as '<path>.1'.
+    """
+
+    PAGE = 256
+
+    def __init__(self, path: str, memory_records: int = 1000, max_bytes: int = 256 * 1024 * 1024,
+                 cached_pages: int = 16):
+        self.path = path
+        self.memory_records = memory_records
+        self.max_bytes = max_bytes
+        self.cached_pages = cached_pages
+
+        self.file = None
+        self.offsets = array('q')  # record number -> file offset
+        self.times = array('d')  # record number -> archive time (ascending)
+        self.index = ConnectionIndex()
+        self.recent = OrderedDict()  # record number -> record, most recent last
+        self.pages = OrderedDict()  # page number -> [records], LRU
+
+        self.rotate()
+
+    def rotate(self):
+        if self.file:
+            self.file.close()
+
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + ".1")
+
+        self.file = open(self.path, "w+b")
+        self.offsets = array('q')
+        self.times = array('d')
+        self.index.clear()
+        self.recent.clear()
+        self.pages.clear()
+
+    def size(self) -> int:
+        return len(self.offsets)
+
+    def full(self) -> bool:
+        return self.file.tell() > self.max_bytes
+
+    def append_many(self, records: list):
+        # [ConnectionRecord]
+        now = time.time()
+        self.file.seek(0, os.SEEK_END)
+        pos = self.file.tell()
+
+        chunks = []
+        for record in records:
+            data = jsoncodec.dumps_bytes(record.to_dict()) + b"\n"
+            chunks.append(data)
+
+            recno = len(self.offsets)
+            self.offsets.append(pos)
+            self.times.append(now)
+            pos += len(data)
+
+            self.index.add(recno, record)
+
+            self.recent[recno] = record
+
+        while len(self.recent) > self.memory_records:
+            self.recent.popitem(last=False)
+
+        self.file.write(b"".join(chunks))
+        self.file.flush()
+
+    def get(self, recno: int):
+        record = self.recent.get(recno)
+        if record is not None:
+            return record
+
+        page = recno // AtticStore.PAGE
+        records = self.pages.get(page)
+        if records is None:
+            records = self.load_page(page)
+            # last page is still being appended to, it's not cached until complete
+            if len(records) == AtticStore.PAGE:
+                self.pages[page] = records
+                while len(self.pages) > self.cached_pages:
+                    self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page)
+
+        return records[recno - page * AtticStore.PAGE]
+
+    def load_page(self, page: int) -> list:
+        first = page * AtticStore.PAGE
+        last = min(first + AtticStore.PAGE, len(self.offsets))
+
+        # records of a page are stored one after another
+        self.file.seek(self.offsets[first])
+        if last < len(self.offsets):
+            data = self.file.read(self.offsets[last] - self.offsets[first])
+        else:
+            data = self.file.read()
+
+        try:
+            return [ConnectionRecord.from_dict(jsoncodec.loads(line)) for line in data.splitlines()]
+        except (ValueError, KeyError) as e:
+            log.error(f"attic: corrupted page {page}: {e}")
+            return [ConnectionRecord("?", "?", (), 0)] * (last - first)
+
+    def query(self, flt: ConnectionFilter) -> list:
+        # matching record numbers, ascending
+        if flt.closed_since is None:
+            return sorted(self.index.query(flt))
+
+        # 'closed' term is matched against archive time
+        first = self.find_time(flt.closed_since)
+        if not flt.indexed():
+            return list(range(first, self.size()))
+        return sorted(recno for recno in self.index.query(flt) if recno >= first)
+
+    def find_time(self, since: float) -> int:
+        # first record number archived at 'since' or later
+        return bisect_left(self.times, since)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
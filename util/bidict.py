@@ -27,6 +27,17 @@ class BiDict:
                 del self.inverse[key_or_value]
                 del self.forward[key_from_inverse]
 
+    def insert_many(self, items: dict):
+        for key, value in items.items():
+            self.insert(key, value)
+
+    def remove_many(self, keys):
+        # keys only, values are looked up in forward map
+        for key in keys:
+            value = self.forward.pop(key, None)
+            if value is not None:
+                self.inverse.pop(value, None)
+
     def get_forward(self, key):
         return self.forward.get(key)
 
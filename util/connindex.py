@@ -0,0 +1,320 @@
+import ipaddress
+import time
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+
+@lru_cache(maxsize=65536)
+def ip_key(text: str):
+    # (version, address as int), None if not an address
+    try:
+        address = ipaddress.ip_address(text)
+    except ValueError:
+        return None
+    return address.version, int(address)
+
+
+def port_key(text: str):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+# Most indexed values (proxy ids, client addresses and ports) belong to one record only,
+# value -> keys maps keep a single key as it is and switch to a set with the second one.
+
+def add_key(index: dict, value, key) -> bool:
+    # returns True if value is new
+    keys = index.get(value)
+    if keys is None:
+        index[value] = key
+        return True
+    if type(keys) is set:
+        keys.add(key)
+    elif keys != key:
+        index[value] = {keys, key}
+    return False
+
+
+def discard_key(index: dict, value, key) -> bool:
+    # returns True if value is gone
+    keys = index.get(value)
+    if keys is None:
+        return False
+    if type(keys) is set:
+        keys.discard(key)
+        if len(keys) > 1:
+            return False
+        if keys:
+            index[value] = keys.pop()
+            return False
+    elif keys != key:
+        return False
+    del index[value]
+    return True
+
+
+def keys_of(index: dict, value) -> set:
+    keys = index.get(value)
+    if keys is None:
+        return set()
+    return keys if type(keys) is set else {keys}
+
+
+class SortedIndex:
+    """
+    Keys by value, range lookup (port range, CIDR as address range) is a bisect in sorted
+    distinct values plus union of matching values' keys. Updates are O(1), values are sorted
+    lazily when a range is asked for after changes (queries are rare, updates are not).
+    """
+
+    def __init__(self):
+        self.keys = {}  # value -> key, or set of keys
+        self.values = []  # sorted distinct values, valid if not dirty
+        self.dirty = False
+
+    def add(self, value, key):
+        if add_key(self.keys, value, key):
+            self.dirty = True
+
+    def remove(self, value, key):
+        if discard_key(self.keys, value, key):
+            self.dirty = True
+
+    def range(self, lo, hi) -> set:
+        if self.dirty:
+            self.values = sorted(self.keys)
+            self.dirty = False
+
+        values = self.values[bisect_left(self.values, lo):bisect_right(self.values, hi)]
+        if len(values) == 1:
+            return keys_of(self.keys, values[0])
+        result = set()
+        for v in values:
+            keys = self.keys[v]
+            if type(keys) is set:
+                result |= keys
+            else:
+                result.add(keys)
+        return result
+
+    def clear(self):
+        self.keys.clear()
+        self.values = []
+        self.dirty = False
+
+
+class ConnectionFilter:
+    """
+    Parsed filter bar text: space separated terms, all of them must match.
+      10.0.0.1, 10.0.0.0/8, ip:2001:db8::/32   source or destination address in network
+      port:443, port:1000-2000                 source or destination port in range
+      state:closed, state:open                 connection state
+      id:1234                                  proxy (session) id
+      closed:90s, closed:15m, closed:2h        closed (Attic: archived) in the last period
+      label:text, any other word               label substring (case insensitive)
+    """
+
+    __slots__ = ("nets", "ports", "states", "ids", "labels", "closed_since")
+
+    DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+    def __init__(self):
+        self.nets = []  # (version, first, last)
+        self.ports = []  # (first, last)
+        self.states = []
+        self.ids = []
+        self.labels = []
+        self.closed_since = None  # timestamp, period is counted from parsing
+
+    def empty(self) -> bool:
+        return not (self.indexed() or self.closed_since is not None)
+
+    def indexed(self) -> bool:
+        # terms answered by ConnectionIndex, time is checked by the owner of records
+        return bool(self.nets or self.ports or self.states or self.ids or self.labels)
+
+    @staticmethod
+    def parse(text: str) -> 'ConnectionFilter':
+        """
+        Raises ValueError on malformed term.
+        """
+        flt = ConnectionFilter()
+        for term in text.split():
+            kind, sep, value = term.partition(':')
+            if not sep or kind not in ("ip", "port", "state", "id", "closed", "label"):
+                kind, value = None, term
+
+            if kind in ("ip", None):
+                try:
+                    net = ipaddress.ip_network(value, strict=False)
+                except ValueError:
+                    if kind:
+                        raise ValueError(f"bad address or network: {value}")
+                    flt.labels.append(value.lower())
+                    continue
+                flt.nets.append((net.version, int(net.network_address), int(net.broadcast_address)))
+
+            elif kind == "port":
+                first, _, last = value.partition('-')
+                try:
+                    first = int(first)
+                    last = int(last) if last else first
+                except ValueError:
+                    raise ValueError(f"bad port or port range: {value}")
+                flt.ports.append((first, last))
+
+            elif kind == "state":
+                state = value.upper()
+                flt.states.append("" if state == "OPEN" else state)
+
+            elif kind == "id":
+                flt.ids.append(value)
+
+            elif kind == "closed":
+                unit = ConnectionFilter.DURATION_UNITS.get(value[-1:].lower())
+                try:
+                    period = float(value[:-1] if unit else value) * (unit or 1)
+                except ValueError:
+                    raise ValueError(f"bad period: {value}")
+                since = time.time() - period
+                flt.closed_since = since if flt.closed_since is None else max(flt.closed_since, since)
+
+            else:
+                flt.labels.append(value.lower())
+
+        return flt
+
+    def matches(self, record, closed_ts: float = None) -> bool:
+        # direct evaluation on one record, closed_ts overrides record's stop time (Attic: archive time)
+        if self.closed_since is not None:
+            if closed_ts is None:
+                closed_ts = record.stop_ts
+            if closed_ts is None or closed_ts < self.closed_since:
+                return False
+
+        tup = record.tuple
+        addresses = [ip_key(tup[i]) for i in (0, 2) if i < len(tup)]
+        ports = [port_key(tup[i]) for i in (1, 3) if i < len(tup)]
+
+        for version, first, last in self.nets:
+            if not any(a and a[0] == version and first <= a[1] <= last for a in addresses):
+                return False
+        for first, last in self.ports:
+            if not any(p is not None and first <= p <= last for p in ports):
+                return False
+        if any(record.state != state for state in self.states):
+            return False
+        if any(record.id != id for id in self.ids):
+            return False
+        if self.labels:
+            label = record.label.lower()
+            if not all(text in label for text in self.labels):
+                return False
+        return True
+
+
+class ConnectionIndex:
+    """
+    Secondary indexes of connection records, maintained as records are added, removed
+    or change state: addresses and ports (sorted, for networks and ranges), state and
+    proxy id (hash). Label substring is checked by scanning labels of the candidates
+    left by indexed terms. Keys are whatever identifies records in the owner's store,
+    with keyed_by_id (keys are proxy ids) the id index is not needed.
+    """
+
+    def __init__(self, keyed_by_id: bool = False):
+        self.keyed_by_id = keyed_by_id
+        self.labels = {}  # key -> label, lowercase
+        self.ids = {}  # proxy id -> key, or set of keys
+        self.states = {}  # state -> set of keys
+        self.addresses = {4: SortedIndex(), 6: SortedIndex()}
+        self.ports = SortedIndex()
+
+    def size(self) -> int:
+        return len(self.labels)
+
+    def add(self, key, record):
+        label = record.label
+        lower = label.lower()
+        # share the record's string if it's lowercase already
+        self.labels[key] = label if lower == label else lower
+        if not self.keyed_by_id:
+            add_key(self.ids, record.id, key)
+        self.states.setdefault(record.state, set()).add(key)
+
+        tup = record.tuple
+        for i in (0, 2):
+            address = ip_key(tup[i]) if i < len(tup) else None
+            if address:
+                self.addresses[address[0]].add(address[1], key)
+        for i in (1, 3):
+            port = port_key(tup[i]) if i < len(tup) else None
+            if port is not None:
+                self.ports.add(port, key)
+
+    def remove(self, key, record):
+        if self.labels.pop(key, None) is None:
+            return
+        if not self.keyed_by_id:
+            discard_key(self.ids, record.id, key)
+        ConnectionIndex.discard(self.states, record.state, key)
+
+        tup = record.tuple
+        for i in (0, 2):
+            address = ip_key(tup[i]) if i < len(tup) else None
+            if address:
+                self.addresses[address[0]].remove(address[1], key)
+        for i in (1, 3):
+            port = port_key(tup[i]) if i < len(tup) else None
+            if port is not None:
+                self.ports.remove(port, key)
+
+    def set_state(self, key, old: str, new: str):
+        ConnectionIndex.discard(self.states, old, key)
+        self.states.setdefault(new, set()).add(key)
+
+    @staticmethod
+    def discard(index: dict, value, key):
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def query(self, flt: ConnectionFilter) -> set:
+        # keys matching indexed terms, 'closed' is left to the caller
+        # smallest sets first, intersections only shrink
+        sets = [self.addresses[version].range(first, last) for version, first, last in flt.nets]
+        sets.extend(self.ports.range(first, last) for first, last in flt.ports)
+        sets.extend(self.states.get(state, set()) for state in flt.states)
+        if self.keyed_by_id:
+            sets.extend({id} if id in self.labels else set() for id in flt.ids)
+        else:
+            sets.extend(keys_of(self.ids, id) for id in flt.ids)
+        sets.sort(key=len)
+
+        labels = self.labels
+        if not sets:
+            if not flt.labels:
+                return set(labels)
+            # label only: one pass over all labels, then narrow by the remaining texts
+            text = flt.labels[0]
+            candidates = {k for k, label in labels.items() if text in label}
+        else:
+            candidates = sets[0]
+            for keys in sets[1:]:
+                candidates = candidates & keys
+
+        for text in flt.labels:
+            candidates = {k for k in candidates if text in labels[k]}
+        return set(candidates)
+
+    def clear(self):
+        self.labels.clear()
+        self.ids.clear()
+        self.states.clear()
+        for index in self.addresses.values():
+            index.clear()
+        self.ports.clear()
@@ -0,0 +1,117 @@
+import base64
+import zlib
+
+from util import jsoncodec
+from util.infohistory import InfoHistory
+from util.util import SessionTuple
+
+
+class ConnectionRecord:
+    """
+    Compact per-connection record: parsed label tuple, timestamps, state and counters
+    in fixed fields. Raw start/stop webhook JSON is kept only if keep_raw is set (zlib compressed),
+    it's decompressed just for displaying details. Connection-info is kept as bounded
+    delta history with the latest info materialized.
+    """
+
+    __slots__ = ("id", "label", "tuple", "state", "start_ts", "stop_ts", "info_count", "info_ts",
+                 "start_raw", "stop_raw", "info", "expiring", "delete_ts")
+
+    # set from config: 'connection_raw_json', 'connection_info_history'
+    keep_raw = False
+    info_limit = 32
+
+    def __init__(self, id: str, label: str, tup: tuple, ts: float, js: dict = None):
+        self.id = id
+        self.label = label
+        self.tuple = tup
+        self.state = ""
+        self.start_ts = ts
+        self.stop_ts = None
+        self.info_count = 0
+        self.info_ts = None
+        self.start_raw = ConnectionRecord.pack(js)
+        self.stop_raw = None
+        self.info = None  # InfoHistory
+        self.expiring = False
+        self.delete_ts = None
+
+    @staticmethod
+    def pack(js):
+        if js is None or not ConnectionRecord.keep_raw:
+            return None
+        return zlib.compress(jsoncodec.dumps_bytes(js), 1)
+
+    @staticmethod
+    def unpack(raw):
+        return jsoncodec.loads(zlib.decompress(raw)) if raw else None
+
+    def stop(self, ts: float, js: dict):
+        self.stop_ts = ts
+        self.stop_raw = ConnectionRecord.pack(js)
+
+    def add_info(self, ts: float, js: dict):
+        self.info_count += 1
+        self.info_ts = ts
+        if js is not None:
+            if self.info is None:
+                self.info = InfoHistory()
+            self.info.update(ts, js, ConnectionRecord.info_limit)
+
+    def details(self) -> dict:
+        # readable form for the details pane, info history is rendered separately
+        def event(ts, raw):
+            return {"ts": ts, "js": ConnectionRecord.unpack(raw)} if raw else {"ts": ts}
+
+        ret = {
+            "id": self.id,
+            "label": self.label,
+            "tuple": self.tuple,
+            "state": self.state,
+            "start": event(self.start_ts, self.start_raw),
+        }
+        if self.stop_ts is not None:
+            ret["stop"] = event(self.stop_ts, self.stop_raw)
+        if self.info_count:
+            ret["info_count"] = self.info_count
+            ret["info_last_ts"] = self.info_ts
+        if self.info is not None:
+            ret["info"] = self.info.state()
+        return ret
+
+    def to_dict(self) -> dict:
+        # serialized form (attic), raw JSON stays compressed
+        def b64(raw):
+            return base64.b64encode(raw).decode() if raw else None
+
+        return {
+            "id": self.id,
+            "label": self.label,
+            "tuple": list(self.tuple),
+            "state": self.state,
+            "start_ts": self.start_ts,
+            "stop_ts": self.stop_ts,
+            "info_count": self.info_count,
+            "info_ts": self.info_ts,
+            "start_raw": b64(self.start_raw),
+            "stop_raw": b64(self.stop_raw),
+            "info": self.info.to_dict() if self.info is not None else None,
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> 'ConnectionRecord':
+        def unb64(text):
+            return base64.b64decode(text) if text else None
+
+        tup = d["tuple"]
+        tup = SessionTuple._make(tup) if len(tup) == len(SessionTuple._fields) else tuple(tup)
+        record = ConnectionRecord(d["id"], d["label"], tup, d["start_ts"])
+        record.state = d["state"]
+        record.stop_ts = d["stop_ts"]
+        record.info_count = d["info_count"]
+        record.info_ts = d["info_ts"]
+        record.start_raw = unb64(d["start_raw"])
+        record.stop_raw = unb64(d["stop_raw"])
+        if d["info"]:
+            record.info = InfoHistory.from_dict(d["info"])
+        return record
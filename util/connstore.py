@@ -0,0 +1,114 @@
+class ConnectionStore:
+    """
+    Connection records indexed by session id, kept in arrival order. Rows are presented
+    newest first: row 0 is the last added record.
+    Removed records leave a tombstone in the order, live slots are counted by a Fenwick tree,
+    so id -> row and row -> id are O(log n) (O(1) with no tombstones) and removing k records
+    is O(k log n). Tombstones are compacted once they are the majority (amortized O(1)).
+    Not thread-safe, it's owned by the GUI thread.
+    """
+
+    def __init__(self):
+        self.records = {}  # id -> record
+        self.order = []  # ids, oldest first, None for removed
+        self.position = {}  # id -> index in order
+        self.tree = [0]  # Fenwick tree over order slots (1-based), 1 for live slot
+        self.removed = 0  # tombstones in order
+
+    def size(self):
+        return len(self.records)
+
+    def __contains__(self, id):
+        return id in self.records
+
+    def get(self, id):
+        return self.records.get(id)
+
+    def live_before(self, index: int) -> int:
+        # live slots in order[:index]
+        count = 0
+        tree = self.tree
+        while index > 0:
+            count += tree[index]
+            index &= index - 1
+        return count
+
+    def add(self, id, record):
+        # caller removes previous record of the same id first
+        self.records[id] = record
+        self.position[id] = len(self.order)
+        self.order.append(id)
+
+        # new Fenwick node covers (i - lowbit(i), i]
+        i = len(self.order)
+        self.tree.append(1 + self.live_before(i - 1) - self.live_before(i - (i & -i)))
+
+    def row_of(self, id) -> int:
+        pos = self.position.get(id)
+        if pos is None:
+            return -1
+        if not self.removed:
+            return len(self.order) - 1 - pos
+        return len(self.records) - 1 - self.live_before(pos)
+
+    def id_at(self, row: int):
+        if not self.removed:
+            return self.order[len(self.order) - 1 - row]
+
+        # k-th live slot from the oldest, Fenwick tree descent
+        k = len(self.records) - row
+        tree = self.tree
+        pos = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] < k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return self.order[pos]
+
+    def record_at(self, row: int):
+        return self.records[self.id_at(row)]
+
+    def values(self):
+        return self.records.values()
+
+    def remove_many(self, ids) -> list:
+        """
+        Remove records, returns the removed ones.
+        """
+        removed = []
+        tree = self.tree
+        for id in ids:
+            record = self.records.pop(id, None)
+            if record is None:
+                continue
+            removed.append(record)
+
+            pos = self.position.pop(id)
+            self.order[pos] = None
+            self.removed += 1
+            i = pos + 1
+            while i < len(tree):
+                tree[i] -= 1
+                i += i & -i
+
+        if self.removed > len(self.records):
+            self.compact()
+
+        return removed
+
+    def compact(self):
+        self.order = [id for id in self.order if id is not None]
+        self.position = {id: pos for pos, id in enumerate(self.order)}
+        # all slots live: node i covers lowbit(i) slots
+        self.tree = [i & -i for i in range(len(self.order) + 1)]
+        self.removed = 0
+
+    def clear(self):
+        self.records.clear()
+        self.order.clear()
+        self.position.clear()
+        self.tree = [0]
+        self.removed = 0
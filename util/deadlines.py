@@ -0,0 +1,35 @@
+import heapq
+import itertools
+
+
+class DeadlineQueue:
+    """
+    Priority queue of (deadline, item). Cancelled or outdated items are not removed from the heap,
+    consumers skip them when they are due (lazy deletion). Not thread-safe.
+    """
+
+    def __init__(self):
+        self.heap = []  # (deadline, seq, item)
+        self.seq = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, deadline: float, item) -> bool:
+        """
+        Returns True if the item is the new earliest deadline (timer should be re-armed).
+        """
+        heapq.heappush(self.heap, (deadline, next(self.seq), item))
+        return self.heap[0][2] is item
+
+    def next_deadline(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: float) -> list:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[2])
+        return due
+
+    def clear(self):
+        self.heap.clear()
@@ -0,0 +1,88 @@
+import time
+
+_MISSING = object()
+
+
+def flatten(js, prefix=()) -> dict:
+    # nested dicts -> {key path tuple: leaf value}
+    flat = {}
+    if isinstance(js, dict):
+        for key, value in js.items():
+            if isinstance(value, dict) and value:
+                flat.update(flatten(value, prefix + (key,)))
+            else:
+                flat[prefix + (key,)] = value
+    else:
+        flat[prefix] = js
+    return flat
+
+
+def unflatten(flat: dict) -> dict:
+    js = {}
+    for path, value in flat.items():
+        node = js
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        if path:
+            node[path[-1]] = value
+    return js
+
+
+class InfoHistory:
+    """
+    Connection-info history of one connection: the latest info is kept materialized (flattened),
+    the history is a bounded list of deltas, each against the previous info:
+    (ts, {path: new value}, (removed paths)). Oldest deltas are dropped when over limit.
+    """
+
+    __slots__ = ("latest", "deltas", "dropped")
+
+    def __init__(self):
+        self.latest = {}
+        self.deltas = []
+        self.dropped = 0
+
+    def update(self, ts: float, js: dict, limit: int):
+        flat = flatten(js)
+        latest = self.latest
+        changed = {k: v for k, v in flat.items() if latest.get(k, _MISSING) != v}
+        removed = tuple(k for k in latest if k not in flat)
+
+        self.deltas.append((ts, changed, removed))
+        if len(self.deltas) > limit:
+            excess = len(self.deltas) - limit
+            del self.deltas[:excess]
+            self.dropped += excess
+        self.latest = flat
+
+    def state(self) -> dict:
+        return unflatten(self.latest)
+
+    @staticmethod
+    def format_delta(delta) -> str:
+        ts, changed, removed = delta
+        items = [f"{'.'.join(map(str, k))}={v!r}" for k, v in changed.items()]
+        items.extend(f"-{'.'.join(map(str, k))}" for k in removed)
+        stamp = time.strftime('%H:%M:%S', time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+        return f"{stamp}  {', '.join(items) if items else '(no change)'}"
+
+    def lines(self, last: int = None) -> list:
+        deltas = self.deltas if last is None else self.deltas[-last:] if last else []
+        return [InfoHistory.format_delta(d) for d in deltas]
+
+    def to_dict(self) -> dict:
+        return {
+            "latest": [[list(k), v] for k, v in self.latest.items()],
+            "deltas": [[ts, [[list(k), v] for k, v in changed.items()], [list(k) for k in removed]]
+                       for ts, changed, removed in self.deltas],
+            "dropped": self.dropped,
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> 'InfoHistory':
+        history = InfoHistory()
+        history.latest = {tuple(k): v for k, v in d["latest"]}
+        history.deltas = [(ts, {tuple(k): v for k, v in changed}, tuple(tuple(k) for k in removed))
+                          for ts, changed, removed in d["deltas"]]
+        history.dropped = d["dropped"]
+        return history
@@ -0,0 +1,46 @@
+"""
+JSON codec used on the webhook path: orjson or ujson if installed, stdlib json otherwise.
+All of them raise ValueError (or its subclass) on invalid input.
+"""
+try:
+    import orjson
+
+    name = "orjson"
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+    try:
+        import ujson
+
+        name = "ujson"
+
+        def loads(data):
+            return ujson.loads(data)
+
+        def dumps(obj) -> str:
+            return ujson.dumps(obj, ensure_ascii=False)
+
+        def dumps_bytes(obj) -> bytes:
+            return dumps(obj).encode()
+
+    except ImportError:
+        import json
+
+        name = "json"
+
+        def loads(data):
+            return json.loads(data)
+
+        def dumps(obj) -> str:
+            return json.dumps(obj)
+
+        def dumps_bytes(obj) -> bytes:
+            return json.dumps(obj).encode()
@@ -0,0 +1,59 @@
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+
+class PendingRequest:
+    def __init__(self, key: tuple, session_id: str, payload):
+        self.key = key  # (session_id, sequence number)
+        self.session_id = session_id
+        self.payload = payload
+        self.future = Future()
+        self.ts = time.time()
+        self.started = None  # processing start timestamp
+
+
+class PendingTable:
+    """
+    Requests waiting for their result, keyed by (session_id, sequence number).
+    Each request has its own future, so independent requests are answered in parallel,
+    and each result is delivered to the request it belongs to.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}  # (session_id, seq) -> PendingRequest
+        self.seq = itertools.count(1)
+
+    def size(self):
+        with self.lock:
+            return len(self.requests)
+
+    def open(self, session_id: str, payload) -> PendingRequest:
+        req = PendingRequest((session_id, next(self.seq)), session_id, payload)
+        with self.lock:
+            self.requests[req.key] = req
+        return req
+
+    def get(self, key: tuple):
+        with self.lock:
+            return self.requests.get(key)
+
+    def resolve(self, key: tuple, result) -> bool:
+        # returns False if the request is not waiting anymore (answered or timed out)
+        with self.lock:
+            req = self.requests.pop(key, None)
+
+        if req is None or req.future.done():
+            return False
+
+        req.future.set_result(result)
+        return True
+
+    def close(self, key: tuple):
+        with self.lock:
+            req = self.requests.pop(key, None)
+
+        if req is not None:
+            req.future.cancel()
@@ -0,0 +1,55 @@
+import threading
+
+
+class QObject:
+    """Plain base class standing in for QtCore.QObject when running without Qt."""
+    pass
+
+
+class BoundSignal:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = []
+
+    def connect(self, slot):
+        with self.lock:
+            self.slots.append(slot)
+
+    def disconnect(self, slot):
+        with self.lock:
+            try:
+                self.slots.remove(slot)
+            except ValueError:
+                # same as pyqtSignal
+                raise TypeError("disconnect() failed: slot not connected")
+
+    def emit(self, *args):
+        with self.lock:
+            slots = list(self.slots)
+
+        # without an event loop slots are called directly, in the emitting thread
+        for slot in slots:
+            slot(*args)
+
+
+class Signal:
+    """
+    Minimal stand-in for pyqtSignal, used when running without Qt.
+    Like pyqtSignal it's declared on the class, each instance gets its own bound signal.
+    """
+
+    def __init__(self, *types):
+        self.types = types
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        bound = instance.__dict__.get(self.name)
+        if bound is None:
+            bound = instance.__dict__.setdefault(self.name, BoundSignal())
+        return bound
@@ -0,0 +1,100 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+
+class TokenEntry:
+    __slots__ = ("token", "identity", "created", "uses", "last_used", "queued")
+
+    def __init__(self, token: str, identity):
+        self.token = token
+        self.identity = identity
+        self.created = time.time()
+        self.uses = 0
+        self.last_used = None
+        self.queued = self.created  # when moved to the end of eviction order
+
+
+class TokenStore:
+    """
+    Bounded set of dynamic tokens with O(1) lookup. Entries are keyed by token digest,
+    so lookup time doesn't depend on how much of a guessed token matches, the token itself
+    is then compared in constant time.
+
+    Changes (rare) are made under the lock, validation (every request) reads the current
+    read-only snapshot and never blocks. A new snapshot is published only when the set
+    of tokens changes. Eviction is approximate LRU (second chance): validation can't reorder
+    entries without the lock, so the oldest entry used since it was queued is moved
+    to the end instead of being evicted.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # digest -> TokenEntry, eviction order (oldest first)
+        self.snapshot = MappingProxyType({})
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def size(self):
+        return len(self.snapshot)
+
+    def add(self, token: str, identity) -> list:
+        """
+        Insert (or refresh) token, returns identities of evicted tokens.
+        """
+        key = TokenStore.digest(token)
+        evicted = []
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                # entry is shared with the snapshot, nothing to publish
+                entry.identity = identity
+                entry.queued = time.time()
+                self.entries.move_to_end(key)
+                return evicted
+
+            self.entries[key] = TokenEntry(token, identity)
+
+            # at most one pass over entries, each second chance moves the entry to the end
+            chances = len(self.entries)
+            while len(self.entries) > self.max_tokens:
+                oldest_key, oldest = next(iter(self.entries.items()))
+                if chances and oldest.last_used and oldest.last_used > oldest.queued:
+                    chances -= 1
+                    oldest.queued = time.time()
+                    self.entries.move_to_end(oldest_key)
+                    continue
+                self.entries.popitem(last=False)
+                evicted.append(oldest.identity)
+
+            self.snapshot = MappingProxyType(dict(self.entries))
+        return evicted
+
+    def remove(self, token: str):
+        with self.lock:
+            if self.entries.pop(TokenStore.digest(token), None):
+                self.snapshot = MappingProxyType(dict(self.entries))
+
+    def validate(self, token: str) -> bool:
+        entry = self.snapshot.get(TokenStore.digest(token))
+        if entry is None or not hmac.compare_digest(entry.token.encode(), token.encode()):
+            return False
+
+        # usage counters are statistics, concurrent updates may (rarely) lose a count
+        entry.uses += 1
+        entry.last_used = time.time()
+        return True
+
+    def identity(self, token: str):
+        entry = self.snapshot.get(TokenStore.digest(token))
+        return entry.identity if entry else None
+
+    def usage(self) -> list:
+        # (identity, uses, last used timestamp)
+        return [(e.identity, e.uses, e.last_used) for e in self.snapshot.values()]
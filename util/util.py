@@ -1,6 +1,9 @@
 import sys
 import re
+import threading
+from collections import namedtuple
 from contextlib import contextmanager
+from functools import lru_cache
 
 class CharFilter:
     # Class attributes storing regex patterns
@@ -36,16 +39,43 @@ class CharFilter:
         repl = replacement or ''
         return re.sub(CharFilter.USERNAME_REGEX, repl, input_string)
 
-def session_tuple(value: str):
-    pattern = r"(?:.*_)?([\d.:a-fA-F]+):(\d+)"
-    pattern = pattern + r"\+" + pattern
-    match = re.search(pattern, value)
+# parsed session label, e.g. 'tcp_10.0.0.1:51234+192.0.2.1:443'; prefix is what precedes the last '_'
+# before source address ('' if none), indexes 0-3 are addresses and ports as before
+SessionTuple = namedtuple("SessionTuple", ["src", "sport", "dst", "dport", "prefix"])
+
+_SESSION_PATTERN = re.compile(r"(?:.*_)?([\d.:a-fA-F]+):(\d+)\+(?:.*_)?([\d.:a-fA-F]+):(\d+)")
+
 
-    if match:
-        return match.groups()
-    else:
+@lru_cache(maxsize=16384)
+def session_tuple(value: str):
+    """
+    Parse session label, None if it doesn't contain 'address:port+address:port'.
+    Labels repeat in start/info/stop/content messages, results are cached (LRU, thread-safe).
+    """
+    match = _SESSION_PATTERN.search(value)
+    if match is None:
         return None
 
+    # prefix is sliced out, capturing it in the pattern makes the search much slower
+    start, src_start = match.start(), match.start(1)
+    prefix = value[start:src_start - 1] if src_start > start else ""
+    return SessionTuple._make(match.groups() + (prefix,))
+
+class LazyFormat:
+    """
+    Log argument formatted only when the record is really emitted:
+    log.debug("payload: %s", LazyFormat(pformat, payload))
+    """
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
 def print_bytes(input_bytes):
     ret = ""
     for i in range(0, len(input_bytes), 16):
@@ -56,10 +86,45 @@ def print_bytes(input_bytes):
         ret += f'{i:04x}: {hex_bytes} | {ascii_repr}\n'
     return ret
 
+class ThreadStdout:
+    """
+    sys.stdout replacement writing to per-thread capture buffer, if one is set.
+    Makes stdout capturing safe when scripts run in several threads at once.
+    """
+    install_lock = threading.Lock()
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def target(self):
+        buffer = getattr(self.local, "buffer", None)
+        return buffer if buffer is not None else self.stdout
+
+    def write(self, s):
+        return self.target().write(s)
+
+    def flush(self):
+        return self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stdout, name)
+
+    @staticmethod
+    def install():
+        with ThreadStdout.install_lock:
+            if not isinstance(sys.stdout, ThreadStdout):
+                sys.stdout = ThreadStdout(sys.stdout)
+            return sys.stdout
+
+
 @contextmanager
 def capture_stdout_as_string():
     import io
-    old_stdout = sys.stdout  # Save the current stdout
-    sys.stdout = io.StringIO()  # Redirect stdout to a StringIO object
-    yield sys.stdout
-    sys.stdout = old_stdout  # Restore stdout
\ No newline at end of file
+    stdout = ThreadStdout.install()
+    old_buffer = getattr(stdout.local, "buffer", None)  # Save the current capture (nesting)
+    stdout.local.buffer = io.StringIO()  # Redirect this thread's stdout to a StringIO object
+    try:
+        yield stdout.local.buffer
+    finally:
+        stdout.local.buffer = old_buffer  # Restore stdout
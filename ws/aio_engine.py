@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from ui.config import Config
+from util import jsoncodec
+from ws import metrics
+
+log = logging.getLogger()
+
+
+class HttpError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class HttpRequest:
+    def __init__(self, method: str, path: str, version: str, headers: dict):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+
+    @staticmethod
+    def parse(head: bytes):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HttpError(400, "Bad Request")
+
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise HttpError(400, "Bad Request")
+            headers[name.strip().lower()] = value.strip()
+
+        return HttpRequest(method, target.split("?", 1)[0], version, headers)
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    @property
+    def chunked(self) -> bool:
+        return "chunked" in self.headers.get("transfer-encoding", "").lower()
+
+
+class AsyncioEngine:
+    """
+    Asyncio HTTP/1.1 server engine with keep-alive. Requests are read and answered by the event loop,
+    only actions which may block (waiting for content processing) are handed over to worker threads.
+    """
+
+    MAX_HEAD_SIZE = 64 * 1024
+    MAX_BODY_SIZE = 64 * 1024 * 1024
+
+    REASONS = {
+        100: "Continue",
+        200: "OK",
+        202: "Accepted",
+        400: "Bad Request",
+        404: "Not Found",
+        405: "Method Not Allowed",
+        411: "Length Required",
+        413: "Payload Too Large",
+        500: "Internal Server Error",
+    }
+
+    def __init__(self, webhook):
+        self.webhook = webhook
+
+        with Config.lock:
+            self.keepalive_timeout = Config.config["keepalive_timeout"]
+            workers = Config.config["server_workers"]
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook")
+
+    def run(self, addr: str, port: int, tlsctx: ssl.SSLContext = None):
+        asyncio.run(self.serve(addr, port, tlsctx))
+
+    async def serve(self, addr: str, port: int, tlsctx: ssl.SSLContext = None):
+        try:
+            server = await asyncio.start_server(self.handle_connection, addr, port, ssl=tlsctx,
+                                                limit=AsyncioEngine.MAX_HEAD_SIZE, backlog=1024)
+        except ssl.SSLError as e:
+            log.error(f"TLS error when starting server: {e}")
+            server = await asyncio.start_server(self.handle_connection, addr, port,
+                                                limit=AsyncioEngine.MAX_HEAD_SIZE, backlog=1024)
+
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+                except asyncio.IncompleteReadError:
+                    # peer closed the connection between requests
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, {"error": "Request header too large"}, 400, False)
+                    break
+
+                try:
+                    request = HttpRequest.parse(head)
+                    keep_alive = request.keep_alive
+
+                    if request.headers.get("expect", "").lower() == "100-continue":
+                        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+                    body, code = await self.route(request, reader)
+
+                except HttpError as e:
+                    # request body may be left unread, don't reuse the connection
+                    body, code = {"error": e.message}, e.code
+                    keep_alive = False
+
+                await self.send(writer, body, code, keep_alive)
+                if not keep_alive:
+                    break
+
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        except Exception as e:
+            log.error(f"AsyncioEngine: connection error: {e}")
+        finally:
+            writer.close()
+
+    async def route(self, request: HttpRequest, reader: asyncio.StreamReader):
+        if request.path == "/metrics":
+            if request.method != "GET":
+                raise HttpError(405, "Method Not Allowed")
+            return metrics.registry.render(), 200
+
+        parts = request.path.split("/")
+        if len(parts) != 4 or parts[0] or parts[1] not in ("webhook", "stream-updates") \
+                or not parts[2] or not parts[3]:
+            raise HttpError(404, "Not Found")
+
+        if request.method != "POST":
+            raise HttpError(405, "Method Not Allowed")
+
+        key, dyn = unquote(parts[2]), unquote(parts[3])
+        if parts[1] == "stream-updates":
+            return await self.stream(request, reader, key, dyn)
+
+        return await self.webhook_request(request, reader, key, dyn)
+
+    async def webhook_request(self, request: HttpRequest, reader: asyncio.StreamReader, key: str, dyn: str):
+        data = await self.read_body(request, reader)
+
+        if not self.webhook.authenticate(key, dyn):
+            log.error(f"Invalid credentials {key}/{dyn}")
+            return {"error": "Invalid credentials"}, 400
+
+        try:
+            payload = jsoncodec.loads(data)
+        except ValueError:
+            return {"error": "Invalid JSON"}, 400
+
+        if isinstance(payload, dict) and payload.get("action") in self.webhook.BLOCKING_ACTIONS:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.webhook.dispatch, payload)
+
+        return self.webhook.dispatch(payload)
+
+    async def stream(self, request: HttpRequest, reader: asyncio.StreamReader, key: str, dyn: str):
+        if not self.webhook.authenticate(key, dyn):
+            log.error(f"Invalid credentials {key}/{dyn}")
+            raise HttpError(400, "Invalid credentials")
+
+        if not request.chunked:
+            raise HttpError(411, "Length Required")
+
+        # updates may be sparse, only a chunk already started must arrive in time
+        async for chunk_data in self.read_chunks(reader, None):
+            self.webhook.process_stream_update(chunk_data)
+
+        return {"status": "success"}, 200
+
+    async def read_body(self, request: HttpRequest, reader: asyncio.StreamReader) -> bytes:
+        # stalled body is handled as idle connection: asyncio.TimeoutError closes it
+        if request.chunked:
+            return b"".join([chunk async for chunk in self.read_chunks(reader, self.keepalive_timeout)])
+
+        try:
+            length = int(request.headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(400, "Bad Request")
+
+        if length < 0:
+            raise HttpError(400, "Bad Request")
+        if length > AsyncioEngine.MAX_BODY_SIZE:
+            raise HttpError(413, "Payload Too Large")
+
+        return await asyncio.wait_for(reader.readexactly(length), self.keepalive_timeout)
+
+    async def read_chunks(self, reader: asyncio.StreamReader, idle_timeout: float = None):
+        # idle_timeout: for the next chunk to start (None: no limit), rest of a chunk has keepalive_timeout
+        timeout = self.keepalive_timeout
+        total = 0
+        while True:
+            line = await asyncio.wait_for(reader.readline(), idle_timeout)
+            try:
+                chunk_size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, "Bad Request")
+
+            if chunk_size < 0:
+                raise HttpError(400, "Bad Request")
+
+            if chunk_size == 0:
+                # skip trailers up to the final empty line
+                while await asyncio.wait_for(reader.readline(), timeout) not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+
+            total += chunk_size
+            if total > AsyncioEngine.MAX_BODY_SIZE:
+                raise HttpError(413, "Payload Too Large")
+
+            chunk_data = await asyncio.wait_for(reader.readexactly(chunk_size), timeout)
+            # Skip the trailing `\r\n` after the chunk data
+            await asyncio.wait_for(reader.readexactly(2), timeout)
+            yield chunk_data
+
+    async def send(self, writer: asyncio.StreamWriter, body, code: int, keep_alive: bool):
+        # bytes body is metrics text, other bodies are JSON
+        content_type = metrics.CONTENT_TYPE if isinstance(body, bytes) else "application/json"
+        head = [f"HTTP/1.1 {code} {AsyncioEngine.REASONS.get(code, '')}",
+                f"Content-Type: {content_type}"]
+        if keep_alive:
+            head.append("Connection: keep-alive")
+            head.append(f"Keep-Alive: timeout={int(self.keepalive_timeout)}")
+        else:
+            head.append("Connection: close")
+
+        if isinstance(body, (dict, bytes)):
+            data = body if isinstance(body, bytes) else jsoncodec.dumps_bytes(body)
+            head.append(f"Content-Length: {len(data)}")
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        else:
+            # streamed body - pieces are produced by a generator which may take its time
+            head.append("Transfer-Encoding: chunked")
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+            loop = asyncio.get_running_loop()
+            body = iter(body)
+            while True:
+                piece = await loop.run_in_executor(self.executor, next, body, None)
+                if piece is None:
+                    break
+                if isinstance(piece, str):
+                    piece = piece.encode()
+                if piece:
+                    writer.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+                    await writer.drain()
+
+            writer.write(b"0\r\n\r\n")
+
+        await writer.drain()
@@ -0,0 +1,21 @@
+import binascii
+
+
+class ContentPayload:
+    """
+    Connection content received from the proxy. Data are base64-decoded once, when the payload
+    is parsed, and the same bytes object is then shared read-only by UI and scripts.
+    """
+    __slots__ = ("session_id", "session_label", "side", "data")
+
+    def __init__(self, session_id: str, session_label: str, side: str, data: bytes):
+        self.session_id = session_id
+        self.session_label = session_label
+        self.side = side
+        self.data = data
+
+    @staticmethod
+    def from_payload(payload: dict):
+        info = payload["details"]["info"]
+        return ContentPayload(payload["id"], info["session"], info["side"],
+                              binascii.a2b_base64(info["content"]))
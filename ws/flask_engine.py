@@ -0,0 +1,93 @@
+import logging
+import ssl
+
+from flask import Flask, request, abort, Response
+
+from util import jsoncodec
+from ws import metrics
+
+log = logging.getLogger()
+
+
+class FlaskEngine:
+    """
+    Werkzeug development server engine - each request is handled in its own thread.
+    """
+
+    def __init__(self, webhook):
+        self.webhook = webhook
+
+        wzlog = logging.getLogger('werkzeug')
+        wzlog.propagate = False
+        wzlog.handlers = []
+        wzlog.setLevel("ERROR")
+
+        self.app = Flask(__name__)
+        self.app.logger.handlers = []
+        self.app.logger.setLevel("ERROR")
+
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics_scrape():
+            return Response(metrics.registry.render(), status=200, content_type=metrics.CONTENT_TYPE)
+
+        @self.app.route('/stream-updates/<string:key>/<string:dyn>', methods=['POST'])
+        def stream(key: str, dyn: str):
+            if not self.webhook.authenticate(key, dyn):
+                log.error(f"Invalid credentials {key}/{dyn}")
+                abort(400)
+
+            if 'Transfer-Encoding' not in request.headers or \
+                    'chunked' not in request.headers['Transfer-Encoding']:
+                abort(411)
+
+            while True:
+                # First read the chunk size (in hex)
+                chunk_size = request.stream.readline()
+                if chunk_size == b'':
+                    return FlaskEngine.json_response({"status": "success"})
+
+                # Convert chunk size from hex to int
+                chunk_size = int(chunk_size, 16)
+
+                # Read the chunk data of `chunk_size` length
+                chunk_data = request.stream.read(chunk_size)
+
+                # Skip the trailing `\r\n` after the chunk data
+                request.stream.read(2)
+
+                self.webhook.process_stream_update(chunk_data)
+
+        @self.app.route('/webhook/<string:key>/<string:dyn>', methods=['POST'])
+        def webhook(key: str, dyn: str):
+
+            if not self.webhook.authenticate(key, dyn):
+                log.error(f"Invalid credentials {key}/{dyn}")
+                return FlaskEngine.json_response({"error": "Invalid credentials"}, 400)
+
+            # Process the incoming JSON payload
+            try:
+                payload = jsoncodec.loads(request.get_data())
+            except ValueError:
+                return FlaskEngine.json_response({"error": "Invalid JSON"}, 400)
+
+            body, code = self.webhook.dispatch(payload)
+            if isinstance(body, dict):
+                return FlaskEngine.json_response(body, code)
+
+            return Response(body, status=code, headers={'Content-Type': 'application/json'})
+
+    @staticmethod
+    def json_response(body: dict, code: int = 200) -> Response:
+        return Response(jsoncodec.dumps_bytes(body), status=code, mimetype='application/json')
+
+    def run(self, addr: str, port: int, tlsctx: ssl.SSLContext = None):
+        fallback = False
+        if tlsctx:
+            try:
+                self.app.run(host=addr, port=port, debug=False, use_reloader=False, ssl_context=tlsctx)
+            except ssl.SSLError as e:
+                log.error(f"TLS error when starting server: {e}")
+                fallback = True
+
+        if not tlsctx or fallback:
+            self.app.run(host=addr, port=port, debug=False, use_reloader=False)
@@ -0,0 +1,201 @@
+import bisect
+import math
+import threading
+
+from ui.state import State
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# latency buckets in seconds, from sub-millisecond handlers to content waiting for a click
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def bucket_quantile(q: float, buckets: tuple, counts: list) -> float:
+    """
+    Estimate q-quantile from (non-cumulative) bucket counts, interpolating inside the bucket
+    like Prometheus histogram_quantile(). Values over the last bound are reported as the last bound.
+    """
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and cumulative + count >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+
+    return buckets[-1]
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}  # label values tuple -> value
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self.lock:
+            return self.values.get(label_values, 0)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram. Observations are counted into per-bucket slots,
+    buckets are accumulated only when rendered.
+    """
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}  # label values tuple -> [bucket counts (+ overflow), sum, count]
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.values[label_values] = entry
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {k: (list(v[0]), v[1], v[2]) for k, v in self.values.items()}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read at scrape time from a callable, so nothing has to be updated on the hot path.
+    """
+
+    def __init__(self, name: str, help_text: str, func):
+        self.name = name
+        self.help = help_text
+        self.func = func
+
+    def value(self):
+        return self.func()
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {format_value(self.value())}"]
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def add(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        with self.lock:
+            metrics = list(self.metrics)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+registry = Registry()
+
+webhook_requests = registry.add(Counter(
+    "beholder_webhook_requests_total", "Webhook requests processed, by action and response code", ("action", "code")))
+webhook_latency = registry.add(Histogram(
+    "beholder_webhook_request_seconds", "Webhook action processing time", ("action",)))
+webhook_auth_failures = registry.add(Counter(
+    "beholder_webhook_auth_failures_total", "Webhook requests with invalid credentials"))
+
+content_queue_wait = registry.add(Histogram(
+    "beholder_content_queue_wait_seconds", "Time content request waited for a script worker"))
+script_run = registry.add(Histogram(
+    "beholder_script_run_seconds", "Content script execution time", ("slot",)))
+script_errors = registry.add(Counter(
+    "beholder_script_errors_total", "Content script runs ending with an error", ("slot",)))
+script_overruns = registry.add(Counter(
+    "beholder_script_overruns_total", "Content requests answered 'unchanged' after deadline", ("slot",)))
+script_rejections = registry.add(Counter(
+    "beholder_script_rejections_total", "Content requests rejected with all script workers overrunning"))
+content_replacements = registry.add(Counter(
+    "beholder_content_replacements_total", "Content requests answered with replacement"))
+content_replacement_bytes = registry.add(Counter(
+    "beholder_content_replacement_bytes_total", "Bytes of content sent back as replacement"))
+gui_batch_size = registry.add(Histogram(
+    "beholder_gui_batch_size", "Connection events applied to the GUI in one batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)))
+gui_batch_lag = registry.add(Histogram(
+    "beholder_gui_batch_lag_seconds", "Delay of the oldest connection event in a batch before it's applied"))
+remote_registrations = registry.add(Counter(
+    "beholder_remote_registrations_total", "Webhook registrations at remote smithproxies", ("result",)))
+
+
+def active_sessions():
+    with State.sessions.lock:
+        return State.sessions.sessions.size()
+
+
+sessions_active = registry.add(Gauge(
+    "beholder_sessions_active", "Sessions known from connection-start and ping-plus", active_sessions))
+content_pending = registry.add(Gauge(
+    "beholder_content_pending", "Content requests waiting for their result", State.content.pending.size))
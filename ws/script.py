@@ -0,0 +1,310 @@
+import datetime
+import hashlib
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from util.util import capture_stdout_as_string, print_bytes, CharFilter
+from ui.state import State, Global
+from ui.config import Config
+from ws import metrics
+
+log = logging.getLogger()
+
+
+class ScriptCache:
+    """
+    Compiled code objects keyed by (owner, slot): Content and Workbench tabs have slots of the same
+    numbers, with different scripts. Slot source is compiled again only if its hash changes,
+    compile error is reported once and remembered for the same source.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # (owner, slot) -> (source hash, code object or compile error)
+
+    def get(self, owner: str, slot: int, script: str):
+        digest = hashlib.sha1(script.encode()).digest()
+        key = (owner, slot)
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+        if entry is None or entry[0] != digest:
+            try:
+                code = compile(script, f"<slot_{slot}>", "exec")
+            except (SyntaxError, ValueError) as e:
+                log.error(f"{owner} slot {slot}: script compile error: {e}")
+                code = e
+
+            entry = (digest, code)
+            with self.lock:
+                self.entries[key] = entry
+
+        return entry[1]
+
+    def invalidate(self, owner: str = None, slot: int = None):
+        with self.lock:
+            if owner is None:
+                self.entries.clear()
+            else:
+                self.entries.pop((owner, slot), None)
+
+
+script_cache = ScriptCache()
+
+
+class ScriptResult:
+    def __init__(self, variables: dict):
+        self.variables = variables
+        self.output = ""
+        self.error = None
+        # compile errors are reported by the cache already
+        self.compile_error = False
+
+    @property
+    def replacement(self):
+        return self.variables['content_replacement']
+
+
+def script_variables(content_data, content_side, session_id, session_label) -> dict:
+    exported_data = {
+        "__name__": "__main__",
+        'content_data': content_data,
+        'content_view': memoryview(content_data) if content_data is not None else None,
+        'content_side': content_side,
+        'session_id': session_id,
+        'session_label': session_label,
+        'storage': Global.storage,
+        'storage_lock': Global.lock,
+        'samples': Global.samples,
+        'samples_metadata': Global.samples_metadata,
+        'content_replacement': None,
+        'auto_process': False,
+        # functions
+        'print_bytes': print_bytes,
+        'hex_print': print_bytes,
+        'hexprint': print_bytes,
+        # logging controls
+        'do_log_file': False,
+        'log_filename': None
+    }
+    exported_data['__appvars__'] = exported_data
+    return exported_data
+
+
+def validate_results(exported_data: dict):
+    if exported_data['content_replacement']:
+        if isinstance(exported_data['content_replacement'], str) \
+                or isinstance(exported_data['content_replacement'], bytes):
+            return
+
+        raise TypeError("content_replacement: must be 'bytes' or 'str'")
+
+
+def run_script(script: str, exported_data: dict, slot: int = None, owner: str = "content") -> ScriptResult:
+    """
+    Execute script with exported variables, capturing its output. Doesn't touch any UI,
+    it's safe to call it from any thread. Script of owner's ('content', 'workbench') slot
+    is compiled once and cached.
+    """
+    result = ScriptResult(exported_data)
+
+    code = script
+    if slot is not None:
+        code = script_cache.get(owner, slot, script)
+        if isinstance(code, Exception):
+            result.error = code
+            result.compile_error = True
+            return result
+
+    # Use the capture_stdout_as_string context manager to capture output
+    with capture_stdout_as_string() as captured_output:
+        try:
+            with Config.lock:
+                # add possibility to import directly from project path
+                if Config.config['project_path'] not in sys.path:
+                    sys.path.append(Config.config['project_path'])
+
+            # Execute the script
+            exec(code, exported_data)
+            # After script execution, captured_output.getvalue() contains the output
+            result.output = captured_output.getvalue()
+            validate_results(exported_data)
+
+        except Exception as e:
+            result.error = e
+
+    return result
+
+
+def write_log_file(exported_data: dict, output: str):
+    log_filename = 'log.txt'
+    overridden_log_filename = str(exported_data['log_filename'])
+    if exported_data['log_filename'] is not None and overridden_log_filename != "":
+        tmp = CharFilter.base_filename(overridden_log_filename, replacement='_')
+        if tmp:
+            log_filename = tmp
+
+    with Config.lock:
+        project_path = Config.config["project_path"]
+
+    with open(f'{project_path}/{log_filename}', 'a') as logfile:
+        dt = datetime.datetime.now()
+        logfile.write(f"{dt}:\n")
+        logfile.write(output)
+        logfile.write(f"-- \n")
+
+
+class ScriptRunner:
+    """
+    Runs the active content script slot on a pool of worker threads. Result goes straight
+    to the waiting content request, UI (if any) is only notified to display it.
+    Worker processes are not used: scripts share 'storage', 'samples' and 'storage_lock'.
+    Running script can't be stopped: past the deadline it keeps its worker until it returns.
+    Requests wait in the pool queue, those past their deadline are skipped. New requests are
+    rejected only when all workers are held by scripts already overrunning their deadline.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.workers = 0
+        self.slot = None
+        self.script = None
+        # callable(PendingRequest, ScriptResult) notified after each run
+        self.on_result = None
+        # callable(slot, reason) notified, in the thread which disabled it, when auto-run is switched off
+        self.on_autorun_disabled = None
+        # no UI to re-enable auto-run or to process content manually (headless)
+        self.unattended = False
+        # deadline overruns in a row
+        self.overruns = 0
+        # requests with script running, key -> PendingRequest
+        self.running = {}
+
+    def set_script(self, slot: int, script: str):
+        with self.lock:
+            self.slot = slot
+            self.script = script
+
+    def submit(self, req) -> bool:
+        """
+        Queue script run for the request. Returns False (request is not queued) if every worker
+        is held by a script overrunning its deadline, queued requests would only expire.
+        """
+        with Config.lock:
+            budget = Config.config["content_timeout"]
+
+        now = time.time()
+        with self.lock:
+            if self.executor is None:
+                with Config.lock:
+                    self.workers = Config.config["script_workers"]
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="script")
+
+            hung = sum(1 for r in self.running.values() if now - r.ts > budget)
+            if hung < self.workers:
+                self.executor.submit(self.run, req)
+                return True
+
+        metrics.script_rejections.inc()
+        log.error(f"all {hung} script workers overrunning the deadline - sending 'unchanged'")
+        return False
+
+    def run(self, req):
+        # request was answered while queued (deadline exceeded)
+        if req.future.done():
+            return
+
+        req.started = time.time()
+        metrics.content_queue_wait.observe(req.started - req.ts)
+        with self.lock:
+            slot = self.slot
+            script = self.script
+            self.running[req.key] = req
+
+        try:
+            self.execute(req, slot, script)
+        finally:
+            with self.lock:
+                del self.running[req.key]
+
+    def execute(self, req, slot: int, script: str):
+        content = req.payload
+        exported_data = script_variables(content.data, content.side, content.session_id, content.session_label)
+
+        d1 = time.time()
+        result = run_script(script or "", exported_data, slot, "content")
+        d2 = time.time()
+        log.info(f"::: content script execution took {(d2 - d1):.2f}s")
+        metrics.script_run.observe(d2 - d1, str(slot))
+
+        with Config.lock:
+            budget = Config.config["content_timeout"]
+
+        if d2 - req.ts > budget:
+            log.warning(f"slot {slot}: script finished late, {(d2 - req.ts):.2f}s after request arrival "
+                        f"(budget {budget:.2f}s, run {(d2 - d1):.2f}s)")
+        else:
+            with self.lock:
+                self.overruns = 0
+
+        replacement = None
+        if result.error:
+            metrics.script_errors.inc(str(slot))
+            if not result.compile_error:
+                log.error(f"slot {slot}: error executing script: {result.error}")
+        else:
+            replacement = result.replacement
+            if result.output and exported_data['do_log_file']:
+                write_log_file(exported_data, result.output)
+
+        # failed script leaves content unchanged
+        if not State.content.pending.resolve(req.key, replacement):
+            log.debug(f"content request {req.key} not waiting anymore")
+
+        if self.on_result:
+            self.on_result(req, result)
+
+    def overrun(self, req, budget: float):
+        # request deadline passed without script result, proxy is answered 'unchanged'
+        now = time.time()
+        with self.lock:
+            slot = self.slot
+            self.overruns += 1
+            overruns = self.overruns
+
+        metrics.script_overruns.inc(str(slot))
+
+        if req.started:
+            log.error(f"slot {slot}: script overran {budget:.2f}s budget: running {(now - req.started):.2f}s, "
+                      f"queued {(req.started - req.ts):.2f}s - sending 'unchanged'")
+        else:
+            log.error(f"slot {slot}: script overran {budget:.2f}s budget: still queued after {(now - req.ts):.2f}s "
+                      f"- sending 'unchanged'")
+
+        with Config.lock:
+            limit = Config.config["script_overrun_limit"]
+
+        if limit and overruns >= limit:
+            with self.lock:
+                self.overruns = 0
+
+            with State.ui.lock:
+                was_enabled = State.ui.content_tab.autorun
+                State.ui.content_tab.autorun = False
+                if self.unattended:
+                    # nobody to process content manually, let it pass without waiting
+                    State.ui.skip_click = True
+
+            if was_enabled:
+                reason = f"{overruns} deadline overruns in a row"
+                log.error(f"slot {slot}: auto-run disabled: {reason}")
+                if self.on_autorun_disabled:
+                    self.on_autorun_disabled(slot, reason)
+
+
+script_runner = ScriptRunner()
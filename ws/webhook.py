@@ -0,0 +1,362 @@
+import base64
+import concurrent.futures
+import hmac
+import itertools
+import logging
+import time
+from pprint import pformat
+import traceback
+from typing import AnyStr
+
+from ui.state import State
+from ui.config import Config
+from util import jsoncodec
+from util.util import LazyFormat
+from ws import metrics
+from ws.content import ContentPayload
+from ws.script import script_runner
+
+log = logging.getLogger()
+
+
+class Webhook:
+    """
+    Webhook actions processing, independent of the server engine running it.
+    Handlers return (body, code) tuple, where body is a dict to be sent as JSON,
+    or an iterable of strings to be streamed as-is.
+    """
+
+    # actions which may wait for user/script interaction
+    BLOCKING_ACTIONS = {"connection-content"}
+    ACTIONS = {"access-request", "connection-content", "connection-start", "connection-stop",
+               "connection-info", "neighbor", "ping"}
+
+    def __init__(self):
+        # callable(PendingRequest) notified with each content request to be processed
+        self.on_content = None
+        self.trace_counter = itertools.count()
+
+    @staticmethod
+    def authenticate(api_key: str, dynamic_token: str) -> bool:
+        if not Webhook.check_credentials(api_key, dynamic_token):
+            metrics.webhook_auth_failures.inc()
+            return False
+
+        return True
+
+    @staticmethod
+    def check_credentials(api_key: str, dynamic_token: str) -> bool:
+        # lock-free: API key and token set are immutable snapshots, replaced as a whole on change
+        if api_key is None or dynamic_token is None:
+            return False
+
+        key = Config.api_key
+        if key is None or not hmac.compare_digest(api_key.encode(), key.encode()):
+            return False
+
+        return State.auth.validate_token(dynamic_token)
+
+    def dispatch(self, payload: dict):
+
+        # payload is formatted only if the record is really emitted
+        log.debug("== Received payload:\n%s", LazyFormat(pformat, payload))
+
+        # verbose payload trace, sampling 1-in-N payloads
+        trace_every = State.ui.payload_trace_every
+        if trace_every and next(self.trace_counter) % trace_every == 0:
+            log.info("== Payload trace (1/%d):\n%s", trace_every, LazyFormat(pformat, payload))
+
+        t1 = time.perf_counter()
+        body, code = self.process(payload)
+        elapsed = time.perf_counter() - t1
+
+        action = payload.get("action") if isinstance(payload, dict) else None
+        if action not in Webhook.ACTIONS:
+            action = "unknown"
+
+        # streamed (neighbor) body is counted up to the response start
+        metrics.webhook_latency.observe(elapsed, action)
+        metrics.webhook_requests.inc(action, str(code))
+
+        return body, code
+
+    def process(self, payload):
+        try:
+            if payload["action"] == "access-request":
+                return self.process_access_request(payload)
+
+            elif payload["action"] == "connection-content":
+                return self.process_connection_content(payload)
+
+            elif payload["action"] == "connection-start":
+                return self.process_connection_start(payload)
+
+            elif payload["action"] == "connection-stop":
+                return self.process_connection_stop(payload)
+
+            elif payload["action"] == "connection-info":
+                return self.process_connection_info(payload)
+
+            elif payload["action"] == "neighbor":
+                return self.process_neighbor(payload), 200
+
+            elif payload["action"] == "ping":
+                return self.process_ping(payload)
+
+        except KeyError as e:
+            log.error(f'KeyError: {e}')
+            exception_traceback = traceback.format_exc()
+            log.debug(exception_traceback)
+
+        except Exception as gen_e:
+            log.error(f'General exception: {gen_e}')
+            exception_traceback = traceback.format_exc()
+            log.debug(exception_traceback)
+
+        return {"status": "success"}, 200
+
+    def get_action_retcode(self, code):
+        if 200 <= code < 300:
+            with State.ui.lock:
+                ping_plus = State.ui.request_ping_plus
+                State.ui.request_ping_plus = False
+            if ping_plus:
+                return 202
+        return code
+
+    def process_access_request(self, payload):
+
+        session_label = payload["details"]["session"]
+        log.info("::: action - access-request - %s", session_label)
+
+        result = "accept"
+        if "2001:67c:68::76" in payload['details']['session']:
+            result = "reject"
+
+        return {
+            "access-response": result
+        }, 200
+
+    def process_connection_content(self, payload):
+        session_label = payload["details"]["info"]["session"]
+        log.info("::: action - connection content - %s", session_label)
+
+        reply_body = {
+            "action": "none"
+        }
+
+        req = None
+        try:
+            reply_body["action"] = "unchanged"
+
+            # original data are here:
+            # reply_body["content"] = payload['details']['info']['content']
+
+            with State.ui.lock:
+                we_are_in = not State.ui.skip_click
+                auto_run = State.ui.content_tab.autorun
+
+            # without UI attached nobody can process content manually
+            if not auto_run and self.on_content is None:
+                we_are_in = False
+
+            # not_skipping means we make UI to see the packet
+            # auto_run means we will run the script automatically
+            if we_are_in:
+                # parsed and decoded once, every request gets its own slot, replacement is delivered back to it
+                content = ContentPayload.from_payload(payload)
+                req = State.content.pending.open(content.session_id, content)
+                if auto_run and not script_runner.submit(req):
+                    raise Exception("script workers overrunning")
+
+                if self.on_content:
+                    self.on_content(req)
+
+                log.info("waiting 'Execute Script' button to be pressed / auto_process is set by script")
+                with Config.lock:
+                    if auto_run:
+                        # latency budget of the script, proxy gets 'unchanged' when it's exceeded
+                        timeout = Config.config["content_timeout"]
+                    else:
+                        # time to click 'Execute Script' - other requests of this session wait too!
+                        timeout = Config.config["content_manual_timeout"]
+                try:
+                    cont = req.future.result(timeout=timeout)  # Wait for the button to be clicked
+                except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+                    if auto_run:
+                        script_runner.overrun(req, timeout)
+                        raise Exception("script deadline exceeded")
+
+                    log.error(f"no action from user: timed out ({timeout:.2f}s)")
+                    raise Exception("no action from user detected")
+
+                log.info("'Execute Script' triggered")
+
+                if cont:
+                    if isinstance(cont, str):
+                        log.debug("custom replacement detected: %dB", len(cont))
+                        cont = bytes(cont, 'utf-8')
+
+                    if isinstance(cont, bytes):
+                        reply_body["action"] = "replace"
+                        reply_body["content"] = base64.b64encode(cont).decode()
+                        metrics.content_replacements.inc()
+                        metrics.content_replacement_bytes.inc(amount=len(cont))
+                    else:
+                        log.error("replacement not 'bytes' or 'str'")
+            else:
+                log.debug("process_connection_content: not waiting for user action")
+
+        except KeyError:
+            log.error("::: error, no 'content'")
+        except Exception as e:
+            log.error(f"process_connection_content: {e}")
+        finally:
+            if req:
+                State.content.pending.close(req.key)
+
+        log.debug("::: sending %s", reply_body)
+        return reply_body, 200
+
+    def process_connection_start(self, payload):
+
+        session_label = payload["details"]["info"]["session"]
+        log.info("::: action - connection start - %s", session_label)
+
+        session_id = payload["id"]
+
+        with State.sessions.lock:
+            State.sessions.sessions.insert(session_id, session_label)
+            sessions = State.sessions.sessions.size()
+
+        log.debug("session map: %d sessions", sessions)
+
+        State.events.received_session_start.emit(session_id, session_label, payload)
+
+        return {}, self.get_action_retcode(200)
+
+    def process_connection_stop(self, payload):
+        session_label = payload["details"]["info"]["session"]
+        log.info("::: action - connection stop - %s", session_label)
+
+        session_id = payload["id"]
+        with State.sessions.lock:
+            State.sessions.sessions.remove(session_id)
+            sessions = State.sessions.sessions.size()
+
+        log.debug("session map: %d sessions", sessions)
+
+        State.events.received_session_stop.emit(session_id, session_label, payload)
+
+        return {}, self.get_action_retcode(200)
+
+    def process_connection_info(self, payload):
+        session_id = payload["id"]
+        log.info("::: action - connection info - %s", session_id)
+
+        State.events.received_session_info.emit(session_id, None, payload)
+
+        return {}, self.get_action_retcode(200)
+
+    def process_neighbor(self, payload):
+        state = payload["state"]
+        log.info(f"::: action - neighbor/{state}")
+
+        now = time.time()
+        # testing
+        ip_to_append = "1.1.1."
+        tag_to_append = "tag_"
+
+        ret_tupples = []
+        if state == "update" and "addresses" in payload.keys():
+            # for ip in payload["addresses"]:
+            #     log.info(f"::: action - neighbor/{state}, address {ip}")
+            #     ret_tupples.append([ip, f"+wh_{state}"])
+            #
+            #     # send "keepalive"
+            #     now1 = time.time()
+            #     if now1 - now > 5:
+            #         now = now1
+            #         log.info(f"::: action - neighbor/{state}, address {ip} - sending keepalive")
+            #         yield " "
+            #
+            # # testing add dummy testing
+            # for ipx in range(1,255):
+            #     ip = f"{ip_to_append}{ipx}"
+            #     tag = f"{tag_to_append}{ipx}"
+            #     ret_tupples.append([ip, tag])
+            #     time.sleep(0.1)
+            #
+            #     # send "keepalive"
+            #     now1 = time.time()
+            #     if now1 - now > 5:
+            #         now = now1
+            #         log.info(f"::: action - neighbor/{state}, address {ip} - sending keepalive")
+            #         yield " "
+
+            log.info(f"::: action - neighbor/{state} - sending result of ({len(ret_tupples)})")
+            yield jsoncodec.dumps({
+                "status": "success",
+                "params": {
+                    "hostname_tags": ret_tupples,
+                }
+            })
+
+    def process_ping(self, payload):
+        log.info("::: action - ping")
+
+        # sessions proxy still has (empty list means 'unknown', nothing is removed)
+        proxies = payload.get('proxies')
+        alive = set(proxies) if proxies else None
+
+        # ping-plus: "id=label" of sessions we may not know
+        announced = {}
+        if payload.get('proxies-plus'):
+            log.info("ping-plus received")
+            for tup in payload['proxies-plus']:
+                tup = tup.split('=')
+                if len(tup) == 2 and tup[0]:
+                    announced[tup[0]] = tup[1]
+
+        with State.sessions.lock:
+            known = State.sessions.sessions.forward
+            removed = list(known.keys() - alive) if alive is not None else []
+            State.sessions.sessions.remove_many(removed)
+
+            added = {k: v for k, v in announced.items() if not known.get(k)}
+            State.sessions.sessions.insert_many(added)
+
+        log.debug("ping: %d sessions removed, %d added (ping-plus)", len(removed), len(added))
+
+        if added or removed:
+            State.events.sessions_changed.emit(added, removed)
+        State.events.received_ping.emit()
+
+        return {}, 200
+
+    def process_stream_update(self, chunk_data: AnyStr):
+        log.info('stream-update: %dB received: %s', len(chunk_data), chunk_data)
+
+    def make_engine(self):
+        with Config.lock:
+            engine_name = Config.config["server_engine"]
+
+        if engine_name == "asyncio":
+            from ws.aio_engine import AsyncioEngine
+            return AsyncioEngine(self)
+
+        if engine_name != "flask":
+            log.error(f"unknown server engine '{engine_name}', using 'flask'")
+
+        from ws.flask_engine import FlaskEngine
+        return FlaskEngine(self)
+
+    @staticmethod
+    def serve(engine):
+        with Config.lock:
+            port = Config.config["port"]
+            addr = Config.config["address"]
+            tlsctx = Config.ssl_context
+
+        log.info(f"starting {engine.__class__.__name__} at {addr}:{port}")
+        engine.run(addr, port, tlsctx)